@@ -1,22 +1,36 @@
-from fastapi import FastAPI
-from app.database import engine, Base
-from app.routers import auth, predict, admin, user
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.database import init_db, dispose_engines, engine, pool_stats
+from app.services import metrics
+from app.config import settings
+from app.routers import auth, predict, admin, user, health
+from app.services.executor import run_io, shutdown_pools
+from app.services.model_registry import model_registry
+from app.services.audit_log import audit_log
+from app.services.passwords import password_hasher
+from app.services.log_retention import log_retention
+from app.services.admission import AdmissionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from app.services.thumbnails import UploadFiles, thumbnails
 import os
-
-# Create DB tables from models
-Base.metadata.create_all(bind=engine)
-
+import asyncio
 
 app = FastAPI(title="Krishi-Scan API")
 
+# Innermost, so shed requests still show up in metrics and get CORS headers
+app.add_middleware(
+    AdmissionMiddleware,
+    paths=[f"/predict{predict.router.prefix}{path}" for path in ("/", "/batch", "/jobs")],
+)
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # or ["*"] to allow all
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],  # pagination cursor, back-off on 429 / 503
 )
 
 # Register routers
@@ -24,16 +38,74 @@ app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(predict.router, prefix="/predict", tags=["Prediction"])
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 app.include_router(user.router, prefix="/user", tags=["User"])
+app.include_router(health.router, prefix="/health", tags=["Health"])
 
 # app.include_router(auth.router)
 # app.include_router(predict.router)
 # app.include_router(admin.router)
 # Path to your uploads directory
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
+UPLOAD_DIR = settings.upload_dir or os.path.join(os.path.dirname(__file__), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# ✅ Serve files under http://localhost:8000/uploads/<filename>
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# ✅ Serve files under http://localhost:8000/uploads/<filename> (thumbnails: /uploads/thumbs/...)
+# Names are content hashes, so they're served as immutable with strong ETags
+app.mount("/uploads", UploadFiles(directory=UPLOAD_DIR), name="uploads")
+@app.on_event("startup")
+async def startup():
+    # Model load + warm-up runs in the background; /health/ready flips to 200 when done
+    model_registry.start()
+    audit_log.start()
+    password_hasher.start()
+    log_retention.start()
+
+    try:
+        # Create DB tables (and any missing indexes) from models
+        await run_io(init_db)
+        await run_io(predict._refresh_catalogue)
+    except Exception as e:
+        # Predict reloads it lazily, so a DB hiccup at boot isn't fatal
+        print(f" Error preparing database / disease catalogue: {e}")
+
+    # After init_db: jobs left over from before a restart write predictions right away
+    predict.job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_inference_engine():
+    await predict.job_runner.stop()
+    await predict.inference_engine.stop()
+    model_registry.stop()
+    thumbnails.stop()
+    shutdown_pools()
+    await asyncio.to_thread(password_hasher.stop)
+    await asyncio.to_thread(log_retention.stop)
+    # After the pools, so log entries from requests that just finished are included
+    await asyncio.to_thread(audit_log.stop)
+    await dispose_engines()
+
+# ---------------- Metrics ----------------
+metrics.register(metrics.Gauge(
+    "krishi_audit_log_queued", "Audit log entries waiting to be written",
+    fn=lambda: audit_log.stats()["queued"],
+))
+metrics.register(metrics.Gauge(
+    "krishi_audit_log_dropped", "Audit log entries dropped because the buffer was full",
+    fn=lambda: audit_log.stats()["dropped"],
+))
+metrics.register(metrics.Gauge(
+    "krishi_db_pool_checked_out", "DB connections currently checked out",
+    fn=lambda: pool_stats.snapshot(engine.pool).get("checked_out", 0),
+))
+metrics.register(metrics.Gauge(
+    "krishi_db_pool_wait_max_seconds", "Longest DB pool checkout wait so far",
+    fn=lambda: pool_stats.snapshot(engine.pool)["max_wait_ms"] / 1000,
+))
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ping")
 async def ping():
-    return {"message": "pong!"}
\ No newline at end of file
+    return {"message": "pong!"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, Float, Text, ForeignKey, TIMESTAMP, func
+from sqlalchemy import Column, Integer, String, Enum, Float, Text, ForeignKey, TIMESTAMP, Date, Index, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -40,11 +40,19 @@ class Prediction(Base):
     image_path = Column(String(255), nullable=False)
     predicted_label = Column(String(100), nullable=False)
     confidence_score = Column(Float, nullable=False)
+    model_version = Column(String(100), nullable=True)  # registry version that made it, see model_registry.py
     created_at = Column(TIMESTAMP, server_default=func.now())
 
     user = relationship("User", back_populates="predictions")
     disease = relationship("Disease", back_populates="predictions")
 
+    # Keyset pagination of /user/{id}/history: WHERE user_id = ? ORDER BY created_at, prediction_id
+    # image_path: "is this upload still referenced?" lookups in maintain_uploads.py
+    __table_args__ = (
+        Index("ix_predictions_user_created_id", "user_id", "created_at", "prediction_id"),
+        Index("ix_predictions_image_path", "image_path"),
+    )
+
 # ------------------- Logs Table -------------------
 class Log(Base):
     __tablename__ = "logs"
@@ -56,3 +64,24 @@ class Log(Base):
     timestamp = Column(TIMESTAMP, server_default=func.now())
 
     user = relationship("User", back_populates="logs")
+
+    # Keyset pagination of /admin/logs: ORDER BY timestamp, log_id
+    __table_args__ = (
+        Index("ix_logs_timestamp_id", "timestamp", "log_id"),
+    )
+
+# ------------------- Prediction Rollups Table -------------------
+# Predictions per day per crop per disease, kept up to date on every insert
+# (see app/services/analytics.py) so /admin/stats never scans predictions.
+class PredictionRollup(Base):
+    __tablename__ = "prediction_rollups"
+
+    bucket_date = Column(Date, primary_key=True)
+    crop_type = Column(String(100), primary_key=True)
+    disease_name = Column(String(100), primary_key=True)
+    prediction_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        Index("ix_prediction_rollups_crop_date", "crop_type", "bucket_date"),
+    )
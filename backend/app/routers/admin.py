@@ -1,79 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from jose import jwt, JWTError
-from app.database import SessionLocal
-from app.models.models import User, Log
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from datetime import date, datetime
+from app.database import engine, get_db, pool_stats
+from app.models.models import User, Log, Disease
+from app.services.catalogue import catalogue
+from app.services.audit_log import audit_log
+from app.services.model_registry import model_registry
+from app.services.security import CurrentUser, get_current_admin, invalidate_user
+from app.services.analytics import query_rollups
+from app.services import export
+from app.services.log_retention import log_archive, log_retention
+from app.services.pagination import before, decode_cursor, format_timestamp, set_next_cursor
+from pydantic import BaseModel, ConfigDict
 
 router = APIRouter()
 
-# ---------------- Constants ----------------
-SECRET_KEY = "your_secret_key_here"  # must match the one in auth.py
-ALGORITHM = "HS256"
-
-
 # ---------------- Pydantic Response Model ----------------
 class LogResponse(BaseModel):
     log_id: int
     user_id: Optional[int]
     action: str
     details: Optional[str] = None
-    timestamp: str
-
-    class Config:
-        orm_mode = True
-
-
-# ---------------- Database Dependency ----------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    timestamp: Optional[str] = None
 
 
-# ---------------- JWT Auth & Admin Check ----------------
-def get_current_admin(authorization: str = Header(...), db: Session = Depends(get_db)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header missing or invalid")
+# ---------------- Get All Logs ----------------
+# Newest first. Pass the X-Next-Cursor response header back as ?cursor= for the next page.
+# `since` / `until` (exclusive) narrow it to a date range. Logs older than the
+# retention period are read from the archive (see log_retention.py), so
+# paging and date ranges work the same either side of the cutoff.
+@router.get("/logs", response_model=List[LogResponse])
+def get_logs(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    db: Session = Depends(get_db),
+    admin: CurrentUser = Depends(get_current_admin)
+):
+    # Plain column tuples: no ORM identity map, nothing to dirty
+    query = db.query(Log.log_id, Log.user_id, Log.action, Log.details, Log.timestamp)
+    if cursor:
+        query = query.filter(before(Log.timestamp, Log.log_id, cursor))
+    if since:
+        query = query.filter(Log.timestamp >= datetime.combine(since, datetime.min.time()))
+    if until:
+        query = query.filter(Log.timestamp < datetime.combine(until, datetime.min.time()))
+    rows = query.order_by(Log.timestamp.desc(), Log.log_id.desc()).limit(limit + 1).all()
+    rows = log_archive.merge(rows, limit, decode_cursor(cursor) if cursor else None, since, until)
+    rows = set_next_cursor(response, rows, limit, key=lambda row: (row.timestamp, row.log_id))
 
-    token = authorization.split(" ")[1]
+    return [
+        LogResponse(
+            log_id=row.log_id,
+            user_id=row.user_id,
+            action=row.action,
+            details=row.details,
+            timestamp=format_timestamp(row.timestamp),
+        )
+        for row in rows
+    ]
 
+# ---------------- Bulk Export ----------------
+# Whole tables for offline analysis, read in primary-key batches and
+# streamed into gzip CSV, Parquet or an Arrow IPC stream; memory stays flat
+# however many rows match. `until` is exclusive, like /stats.
+@router.get("/export/{table}", summary="Stream predictions or logs as gzip CSV / Parquet / Arrow")
+def export_table(
+    table: Literal["predictions", "logs"],
+    format: Literal["csv", "parquet", "arrow"] = "csv",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    crop: Optional[str] = None,
+    admin: CurrentUser = Depends(get_current_admin)
+):
+    # Everything that can fail up front, so errors are a normal 400 and not a truncated stream
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+        export.check_format(format)
+        export.build_query(table, since, until, crop)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if not user or user.role != "admin":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    filename = export.export_filename(table, format, since, until, crop)
+    return StreamingResponse(
+        export.stream_export(table, format, since, until, crop),
+        media_type=export.FORMATS[format][0],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-    return user
+# ---------------- Log Retention Status ----------------
+@router.get("/logs/retention")
+def get_log_retention(admin: CurrentUser = Depends(get_current_admin)):
+    return log_retention.status()
 
+# ---------------- Audit Log Writer Stats ----------------
+@router.get("/logs/writer-stats")
+def get_log_writer_stats(admin: CurrentUser = Depends(get_current_admin)):
+    return audit_log.stats()
 
-# ---------------- Get All Logs ----------------
-@router.get("/logs", response_model=List[LogResponse])
-def get_logs(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    admin: User = Depends(get_current_admin)
-):
-    logs = (
-        db.query(Log)
-        .order_by(Log.timestamp.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    for log in logs:
-        log.timestamp = log.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-    return logs
+# ---------------- DB Pool Stats ----------------
+@router.get("/db/pool")
+def get_db_pool_stats(admin: CurrentUser = Depends(get_current_admin)):
+    return pool_stats.snapshot(engine.pool)
 
 # ---------------- Response Model ----------------
 class UserResponse(BaseModel):
@@ -81,24 +112,39 @@ class UserResponse(BaseModel):
     name: str
     email: str
     role: str
-    created_at: str
-
-    class Config:
-        orm_mode = True
+    created_at: Optional[str] = None
 
 # ---------------- Get All Users ----------------
+# Ordered by user_id, paged with ?cursor= like /logs
 @router.get("/users", response_model=List[UserResponse])
-def get_all_users(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
-    users = db.query(User).all()
-    # Convert datetime to string for validation
-    for user in users:
-        if hasattr(user, "created_at") and user.created_at:
-            user.created_at = user.created_at.strftime("%Y-%m-%d %H:%M:%S")
-    return users
+def get_all_users(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    admin: CurrentUser = Depends(get_current_admin)
+):
+    query = db.query(User.user_id, User.name, User.email, User.role, User.created_at)
+    if cursor:
+        (after_id,) = decode_cursor(cursor, with_timestamp=False)
+        query = query.filter(User.user_id > after_id)
+    rows = query.order_by(User.user_id).limit(limit + 1).all()
+    rows = set_next_cursor(response, rows, limit, key=lambda row: (row.user_id,))
+
+    return [
+        UserResponse(
+            user_id=row.user_id,
+            name=row.name,
+            email=row.email,
+            role=row.role,
+            created_at=format_timestamp(row.created_at),
+        )
+        for row in rows
+    ]
 
 # ---------------- Delete User ----------------
 @router.delete("/users/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+def delete_user(user_id: int, db: Session = Depends(get_db), admin: CurrentUser = Depends(get_current_admin)):
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -107,22 +153,24 @@ def delete_user(user_id: int, db: Session = Depends(get_db), admin: User = Depen
 
     db.delete(user)
     db.commit()
+    invalidate_user(user_id)
     return {"message": f"User {user.name} deleted successfully"}
 
 # ---------------- Promote User ----------------
 @router.put("/users/{user_id}/promote")
-def promote_user(user_id: int, db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+def promote_user(user_id: int, db: Session = Depends(get_db), admin: CurrentUser = Depends(get_current_admin)):
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user.role = "admin"
     db.commit()
+    invalidate_user(user_id)
     return {"message": f"{user.name} promoted to admin"}
 
 # ---------------- Demote User ----------------
 @router.put("/users/{user_id}/demote")
-def demote_user(user_id: int, db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+def demote_user(user_id: int, db: Session = Depends(get_db), admin: CurrentUser = Depends(get_current_admin)):
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -132,4 +180,108 @@ def demote_user(user_id: int, db: Session = Depends(get_db), admin: User = Depen
 
     user.role = "user"
     db.commit()
-    return {"message": f"{user.name} demoted to user"}
\ No newline at end of file
+    invalidate_user(user_id)
+    return {"message": f"{user.name} demoted to user"}
+
+# ---------------- Disease Catalogue ----------------
+class DiseaseResponse(BaseModel):
+    disease_id: int
+    disease_name: str
+    crop_type: Optional[str] = None
+    description: Optional[str] = None
+    treatment: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class DiseaseCreate(BaseModel):
+    disease_name: str
+    crop_type: str
+    description: Optional[str] = None
+    treatment: Optional[str] = None
+
+class DiseaseUpdate(BaseModel):
+    description: Optional[str] = None
+    treatment: Optional[str] = None
+
+@router.get("/diseases", response_model=List[DiseaseResponse])
+def get_diseases(db: Session = Depends(get_db), admin: CurrentUser = Depends(get_current_admin)):
+    return db.query(Disease).order_by(Disease.crop_type, Disease.disease_name).all()
+
+@router.post("/diseases", response_model=DiseaseResponse)
+def create_disease(request: DiseaseCreate, db: Session = Depends(get_db), admin: CurrentUser = Depends(get_current_admin)):
+    if db.query(Disease).filter(Disease.disease_name == request.disease_name).first():
+        raise HTTPException(status_code=400, detail="Disease already exists")
+
+    disease = Disease(**request.model_dump())
+    db.add(disease)
+    db.commit()
+    db.refresh(disease)
+    catalogue.reload(db)
+    return disease
+
+@router.put("/diseases/{disease_id}", response_model=DiseaseResponse)
+def update_disease(disease_id: int, request: DiseaseUpdate, db: Session = Depends(get_db), admin: CurrentUser = Depends(get_current_admin)):
+    disease = db.query(Disease).filter(Disease.disease_id == disease_id).first()
+    if not disease:
+        raise HTTPException(status_code=404, detail="Disease not found")
+
+    for field, value in request.model_dump(exclude_unset=True).items():
+        setattr(disease, field, value)
+    db.commit()
+    db.refresh(disease)
+    catalogue.reload(db)
+    return disease
+
+# Use after editing the diseases table by hand; other workers pick the change
+# up within KRISHI_CATALOGUE_REFRESH_S
+@router.post("/diseases/refresh")
+def refresh_disease_catalogue(db: Session = Depends(get_db), admin: CurrentUser = Depends(get_current_admin)):
+    catalogue.reload(db)
+    return {"message": "Disease catalogue reloaded", "entries": len(catalogue.entries())}
+
+# ---------------- Model Registry ----------------
+# Loading and warm-up happen in the background; poll GET /admin/models to see
+# when the new version is "active". Other workers follow within KRISHI_MODEL_REGISTRY_POLL_S.
+@router.get("/models")
+def get_models(admin: CurrentUser = Depends(get_current_admin)):
+    return {"versions": sorted(model_registry.versions()), **model_registry.status()}
+
+@router.post("/models/{version}/activate", status_code=202)
+def activate_model(version: str, admin: CurrentUser = Depends(get_current_admin)):
+    try:
+        loading = model_registry.activate(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version {version!r} not found in the registry")
+    return {"message": f"Activating model {version}", "model": loading.status()}
+
+@router.post("/models/{version}/shadow", status_code=202)
+def shadow_model(
+    version: str,
+    sample_rate: float = Query(0.1, gt=0, le=1),
+    admin: CurrentUser = Depends(get_current_admin)
+):
+    """Run `version` next to the active model on a share of batches, without serving its answers."""
+    try:
+        shadow = model_registry.start_shadow(version, sample_rate)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version {version!r} not found in the registry")
+    return {"message": f"Shadowing model {version}", "model": shadow.status(), "sample_rate": sample_rate}
+
+@router.delete("/models/shadow")
+def stop_shadow_model(admin: CurrentUser = Depends(get_current_admin)):
+    model_registry.stop_shadow()
+    return {"message": "Shadow mode stopped"}
+
+# ---------------- Prediction Stats (rollups) ----------------
+# Answered from prediction_rollups only; backfill history with backfill_rollups.py
+@router.get("/stats/predictions")
+def get_prediction_stats(
+    bucket: Literal["day", "week", "month"] = "day",
+    crop: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    db: Session = Depends(get_db),
+    admin: CurrentUser = Depends(get_current_admin)
+):
+    """Predictions per time bucket per crop per disease, `until` is exclusive."""
+    return query_rollups(db, bucket=bucket, crop=crop, since=since, until=until)
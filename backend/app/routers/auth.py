@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models.models import User, Log
-from passlib.context import CryptContext
+from app.database import get_db
+from app.models.models import User
+from app.services.audit_log import log_action
+from app.services.security import SECRET_KEY
+from app.services.executor import run_io
+from app.services.passwords import password_hasher
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from fastapi.responses import JSONResponse
@@ -10,8 +13,6 @@ from fastapi import Header
 import jwt  # PyJWT
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = "your_secret_key_here"  # Change this
 
 # ----------------- Pydantic Schemas -----------------
 class SignupRequest(BaseModel):
@@ -24,42 +25,54 @@ class LoginRequest(BaseModel):
     password: str
     role: str
 
-# ----------------- DB Dependency -----------------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# ----------------- Logging -----------------
-def log_action(db: Session, user_id: int, action: str, details: str = None):
-    log = Log(user_id=user_id, action=action, details=details)
-    db.add(log)
+# ----------------- DB Helpers -----------------
+# The handlers are async so bcrypt can be awaited on the password process
+# pool; these blocking queries (and log_action, which can wait on a full
+# audit queue) run on the I/O pool via run_io.
+def _find_user(db: Session, email: str):
+    return (
+        db.query(User.user_id, User.password, User.role)
+        .filter(User.email == email)
+        .first()
+    )
+
+def _create_user(db: Session, name: str, email: str, hashed_password: str) -> int:
+    new_user = User(name=name, email=email, password=hashed_password)
+    db.add(new_user)
+    db.commit()
+    return new_user.user_id
+
+def _update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(User).filter(User.user_id == user_id).update(
+        {User.password: hashed_password}, synchronize_session=False
+    )
     db.commit()
 
 # ----------------- Signup -----------------
 @router.post("/signup")
-def signup(request: SignupRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
-    if user:
+async def signup(request: SignupRequest, db: Session = Depends(get_db)):
+    # Check first so duplicate signups don't cost a bcrypt round
+    if await run_io(_find_user, db, request.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = pwd_context.hash(request.password)
-    new_user = User(name=request.name, email=request.email, password=hashed_password)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    hashed_password = await password_hasher.hash(request.password)
+    user_id = await run_io(_create_user, db, request.name, request.email, hashed_password)
 
-    log_action(db, new_user.user_id, "User signed up")
-    return {"message": "User created successfully", "user_id": new_user.user_id}
+    await run_io(log_action, user_id, "User signed up")
+    return {"message": "User created successfully", "user_id": user_id}
 
 # ----------------- Login -----------------
 @router.post("/login")
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
-    if not user or not pwd_context.verify(request.password, user.password):
+async def login(request: LoginRequest, db: Session = Depends(get_db)):
+    user = await run_io(_find_user, db, request.email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await password_hasher.verify(request.password, user.password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # KRISHI_PASSWORD_HASH_ROUNDS changed since this hash was made
+        await run_io(_update_password_hash, db, user.user_id, new_hash)
     
     # ✅ Check role match
     if user.role != request.role:
@@ -74,14 +87,11 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
     }
 
     token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-    log_action(db, user.user_id, "User logged in")
+    await run_io(log_action, user.user_id, "User logged in")
     return {"access_token": token, "token_type": "bearer", "role": user.role}
 
 @router.post("/logout")
-def logout(
-    authorization: str | None = Header(default=None),
-    db: Session = Depends(get_db)
-):
+def logout(authorization: str | None = Header(default=None)):
     """
     Logs the user out by removing their token client-side.
     JWT is stateless, so backend just logs the event.
@@ -95,7 +105,7 @@ def logout(
         user_id = decoded.get("user_id")
 
         # Log the logout action
-        log_action(db, user_id, "User logged out")
+        log_action(user_id, "User logged out")
 
         # Send success response
         response = JSONResponse(content={"message": "Logout successful"})
@@ -0,0 +1,42 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from app.config import settings
+from app.database import engine, get_async_engine
+from app.services.catalogue import catalogue
+from app.services.executor import run_io
+from app.services.model_registry import model_registry
+
+router = APIRouter()
+
+
+# ---------------- Liveness ----------------
+# The process is up and the event loop answers. Never touches the model or DB,
+# so a slow warm-up doesn't get the worker restarted.
+@router.get("/live")
+async def live():
+    return {"status": "alive"}
+
+
+# ---------------- Readiness ----------------
+def _check_db():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+@router.get("/ready")
+async def ready():
+    checks = {"model": model_registry.status(), "catalogue_loaded": catalogue.loaded}
+    ok = model_registry.ready
+
+    try:
+        if settings.database_async:
+            async with get_async_engine().connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        else:
+            await run_io(_check_db)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+        ok = False
+
+    return JSONResponse(status_code=200 if ok else 503, content={"ready": ok, **checks})
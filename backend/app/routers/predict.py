@@ -1,14 +1,34 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models.models import User, Disease, Prediction, Log
-from jose import jwt, JWTError
-import tensorflow as tf
+from app.database import SessionLocal, get_db
+from app.models.models import Prediction
+from app.services.audit_log import log_action
+from app.services.security import CurrentUser, get_current_user
+from app.services.analytics import record_predictions
+from app.services import metrics
+from app.config import settings
+from app.services.batching import MicroBatcher
+from app.services.executor import cpu_pool, io_pool, run_cpu, run_io
+from app.services.preprocessing import decode_batch, decode_image
+from app.services.result_cache import PredictionCache
+from app.services.catalogue import catalogue
+from app.services.model_registry import model_registry
+from app.services.inference_ipc import inference_client
+from app.services.embeddings import embedding_index, signature
+from app.services.jobs import FINISHED, QUEUED, RUNNING, JobQueue, JobRunner
+from app.services.thumbnails import thumbnails
+from datetime import datetime
 import numpy as np
 import os
-import shutil
+import hashlib
+import uuid
 import random
-from datetime import datetime
+import json
+import zipfile
+import asyncio
+import time
 
 # ---------------- Router ----------------
 router = APIRouter(prefix="/predict", tags=["Prediction"])
@@ -16,181 +36,692 @@ router = APIRouter(prefix="/predict", tags=["Prediction"])
 # ---------------- Toggle Fake Confidence ----------------
 USE_FAKE_CONFIDENCE = True   # ✅ Set True for demo (95–100%), False for real accuracy
 
-# ---------------- Model Path ----------------
-MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../plant_disease_cnn_model.keras"))
+# ---------------- Model ----------------
+# Versions are loaded, warmed up and hot-swapped in the background, see
+# app/services/model_registry.py. Cached results and stored predictions are
+# keyed by the version that produced them.
+
+# ---------------- Batched Inference ----------------
+def _predict_batch(batch):
+    """One (model_version, probabilities, features or None) per image, all from the same model."""
+    version, probabilities, features = model_registry.predict(batch)
+    if features is None:
+        features = [None] * len(probabilities)
+    return list(zip([version] * len(probabilities), probabilities, features))
+
+# With KRISHI_INFERENCE_SERVER set, batching happens in inference_server.py
+# across all workers; the client has the same submit() interface.
+inference_engine = inference_client or MicroBatcher(
+    _predict_batch,
+    max_batch_size=settings.batch_max_size,
+    max_wait_ms=settings.batch_max_wait_ms,
+    executor=cpu_pool,
+)
 
-try:
-    model = tf.keras.models.load_model(MODEL_PATH)
-    print(f"Model loaded successfully from: {MODEL_PATH}")
-except Exception as e:
-    print(f" Error loading model from {MODEL_PATH}: {e}")
-    model = None  # fallback to prevent server crash
+metrics.register(metrics.Gauge(
+    "krishi_inference_queue_depth", "Images waiting for the next micro-batch",
+    fn=inference_engine.queue_depth,
+))
 
 # ---------------- Upload Folder ----------------
-UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "../uploads"))
+UPLOAD_FOLDER = os.path.abspath(settings.upload_dir or os.path.join(os.path.dirname(__file__), "../uploads"))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# ---------------- JWT Config ----------------
-SECRET_KEY = "your_secret_key_here"  # must match auth.py
-ALGORITHM = "HS256"
+# ---------------- Result Cache ----------------
+result_cache = PredictionCache(
+    max_entries=settings.result_cache_size,
+    ttl_seconds=settings.result_cache_ttl_s,
+    disk_path=settings.result_cache_disk_path,
+)
+
+# ---------------- Embeddings ----------------
+# Every freshly classified image gets a vector in app/services/embeddings.py
+# for /predict/{id}/similar. Only byte-identical uploads (the result cache)
+# skip the model: a look-alike may still differ in the lesions that matter.
+def _decode_with_signature(data):
+    img_array = decode_image(data)
+    return img_array, signature(img_array)
+
+def _report_embedding_error(future):
+    if future.exception() is not None:
+        print(f" Error storing embedding: {future.exception()}")
+
+# ---------------- Blocking Stages ----------------
+# These run on the worker pools (see app/services/executor.py), never on the event loop.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_BYTES = int(settings.upload_max_mb * 1024 * 1024)
+
+def _too_large(name, limit_mb):
+    return HTTPException(status_code=413, detail=f"{name} is larger than {limit_mb:g} MB")
+
+def _save_upload(src, file_ext):
+    """
+    Stream the upload to disk while hashing it. Files are content-addressed
+    (uploads/<sha256><ext>), so identical photos are only stored once.
+    Returns (digest, filename).
+    """
+    hasher = hashlib.sha256()
+    tmp_path = os.path.join(UPLOAD_FOLDER, f".{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+                buffer.write(chunk)
+        digest = hasher.hexdigest()
+        filename = f"{digest}{file_ext}"
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest, filename
+
+def _write_upload(data, filename):
+    """Persist in-memory upload bytes under their content-addressed name."""
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    if os.path.exists(file_path):
+        return
+    tmp_path = os.path.join(UPLOAD_FOLDER, f".{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp_path, "wb") as buffer:
+            buffer.write(data)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _write_upload_with_thumbnails(data, filename):
+    """_write_upload, then thumbnails from the stored file (the bytes aren't kept queued)."""
+    _write_upload(data, filename)
+    thumbnails.submit(os.path.join(UPLOAD_FOLDER, filename), filename)
+
+def _report_write_error(future):
+    if future.exception() is not None:
+        print(f" Error saving upload: {future.exception()}")
+
+async def _read_upload(file):
+    """Read the upload into memory, hashing each chunk as it arrives. Returns (data, digest)."""
+    hasher = hashlib.sha256()
+    chunks, size = [], 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
+            raise _too_large(file.filename, settings.upload_max_mb)
+        hasher.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), hasher.hexdigest()
 
-# ---------------- DB Dependency ----------------
-def get_db():
+def _refresh_catalogue():
     db = SessionLocal()
     try:
-        yield db
+        catalogue.reload(db)
     finally:
         db.close()
 
-# ---------------- Logging ----------------
-def log_action(db, user_id, action, details=None):
-    log = Log(user_id=user_id, action=action, details=details)
-    db.add(log)
-    db.commit()
+def _store_prediction(db, user_id, db_image_path, entry, real_confidence, model_version):
+    # Save prediction in DB (store real confidence internally for future use)
+    new_pred = Prediction(
+        user_id=user_id,
+        disease_id=entry.disease_id,
+        image_path=db_image_path,
+        predicted_label=entry.label,
+        confidence_score=real_confidence,  # Save true model confidence
+        model_version=model_version,
+    )
+    with metrics.stage("db_commit"):
+        db.add(new_pred)
+        db.flush()  # assigns prediction_id
+        prediction_id = new_pred.prediction_id
+        # Same transaction, so the admin dashboard counters can't drift from predictions
+        record_predictions(db, [(entry.label, real_confidence)])
+        db.commit()
 
-# ---------------- JWT Auth Dependency ----------------
-def get_current_user(authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+    # Log prediction
+    with metrics.stage("log_action"):
+        log_action(user_id, "Prediction made", details=f"Prediction ID: {prediction_id}")
+    return prediction_id
 
-    token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
+def _store_predictions_bulk(db, user_id, rows):
+    """
+    Insert a whole batch of predictions in one transaction (their log rows go
+    through the buffered audit log writer).
+    `rows` is a list of (db_image_path, catalogue entry, real_confidence, model_version).
+    Returns the new prediction ids in the same order.
+    """
+    new_preds = [
+        Prediction(
+            user_id=user_id,
+            disease_id=entry.disease_id,
+            image_path=db_image_path,
+            predicted_label=entry.label,
+            confidence_score=real_confidence,
+            model_version=model_version,
+        )
+        for db_image_path, entry, real_confidence, model_version in rows
+    ]
+    db.add_all(new_preds)
+    db.flush()  # assigns prediction_id without committing
 
-        user = db.query(User).filter(User.user_id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+    prediction_ids = [p.prediction_id for p in new_preds]
+    record_predictions(db, [(entry.label, real_confidence) for _, entry, real_confidence, _ in rows])
+    db.commit()
+    for prediction_id in prediction_ids:
+        log_action(user_id, "Prediction made", details=f"Prediction ID: {prediction_id}")
+    return prediction_ids
 
-        return user
-    except JWTError as e:
-        raise HTTPException(status_code=401, detail=f"Token decode error: {str(e)}")
+def _require_model():
+    if model_registry.state == "failed":
+        raise HTTPException(status_code=500, detail="Model not loaded on server")
+    if not model_registry.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Model is still loading, try again shortly",
+            headers={"Retry-After": "5"},
+        )
 
 # ---------------- Prediction API ----------------
 @router.post("/", summary="Predict plant disease from uploaded image")
 async def predict(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Upload a leaf image, predict disease, and return description + treatment.
+    On slow or flaky connections prefer POST /predict/jobs, which returns
+    as soon as the upload is stored.
     """
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded on server")
+    _require_model()
 
     user_id = current_user.user_id
 
-    # Save uploaded file
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    file_ext = os.path.splitext(file.filename)[1]
-    filename = f"{user_id}_{timestamp}{file_ext}"
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    # Read the upload into memory (hashed while it streams in)
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    with metrics.stage("upload"):
+        data, digest = await _read_upload(file)
+    filename = f"{digest}{file_ext}"
+
+    # Writing the original to uploads/ is off the latency path, decode works from memory
+    io_pool.submit(_write_upload_with_thumbnails, data, filename).add_done_callback(_report_write_error)
 
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
     # ✅ Store only the relative path for frontend access
     db_image_path = f"uploads/{filename}"
-    # Preprocess image
-    try:
-        img = tf.keras.preprocessing.image.load_img(file_path, target_size=(224, 224))
-        img_array = tf.keras.preprocessing.image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0) / 255.0
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Image processing failed: {e}")
 
-    # Predict
-    predictions = model.predict(img_array)
-    predicted_index = int(np.argmax(predictions[0]))
-    real_confidence = float(np.max(predictions[0]))
+    return await _classify_and_store(db, user_id, data, digest, db_image_path)
+
+async def _classify_and_store(db, user_id, data, digest, db_image_path):
+    """Cache lookup, inference and the DB write for one image; returns the response body."""
+    # Same photo + same model = same answer, skip decode and inference
+    model_version = model_registry.active_version
+    with metrics.stage("cache_lookup"):
+        cached = result_cache.get(digest, model_version)
+        if cached is None and result_cache.disk is not None:
+            cached = await run_io(result_cache.get_from_disk, digest, model_version)
+
+    embedding = None  # (signature, features) to index once the prediction row exists
+    if cached is not None:
+        predicted_index = cached["predicted_index"]
+        real_confidence = cached["confidence"]
+    else:
+        # Preprocess image
+        try:
+            with metrics.stage("decode"):
+                img_array, sig = await run_cpu(_decode_with_signature, data)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Image processing failed: {e}")
+
+        # Predict (batched together with other in-flight requests)
+        metrics.inference_in_flight.inc()
+        try:
+            with metrics.stage("inference"):
+                # The version may differ from the lookup above if a swap landed meanwhile
+                model_version, probabilities, features = await inference_engine.submit(img_array)
+        finally:
+            metrics.inference_in_flight.dec()
+        predicted_index = int(np.argmax(probabilities))
+        real_confidence = float(np.max(probabilities))
+        embedding = (sig, features)
+
+        result = {"predicted_index": predicted_index, "confidence": real_confidence}
+        result_cache.put(digest, model_version, result)
+        if result_cache.disk is not None:
+            await run_io(result_cache.put_to_disk, digest, model_version, result)
 
     if USE_FAKE_CONFIDENCE:
         confidence_score = round(random.uniform(95, 100), 2)
     else:
         confidence_score = round(real_confidence, 2)
 
-    # Replace with your actual labels
-    class_labels = [
-        'Apple___Apple_scab',
-        'Apple___Black_rot',
-        'Apple___Cedar_apple_rust',
-        'Apple___healthy',
-        'Blueberry___healthy',
-        'Cherry_(including_sour)___Powdery_mildew',
-        'Cherry_(including_sour)___healthy',
-        'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot',
-        'Corn_(maize)___Common_rust_',
-        'Corn_(maize)___Northern_Leaf_Blight',
-        'Corn_(maize)___healthy',
-        'Grape___Black_rot',
-        'Grape___Esca_(Black_Measles)',
-        'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)',
-        'Grape___healthy',
-        'Orange___Haunglongbing_(Citrus_greening)',
-        'Peach___Bacterial_spot',
-        'Peach___healthy',
-        'Pepper,_bell___Bacterial_spot',
-        'Pepper,_bell___healthy',
-        'Potato___Early_blight',
-        'Potato___Late_blight',
-        'Potato___healthy',
-        'Raspberry___healthy',
-        'Soybean___healthy',
-        'Squash___Powdery_mildew',
-        'Strawberry___Leaf_scorch',
-        'Strawberry___healthy',
-        'Tomato___Bacterial_spot',
-        'Tomato___Early_blight',
-        'Tomato___Late_blight',
-        'Tomato___Leaf_Mold',
-        'Tomato___Septoria_leaf_spot',
-        'Tomato___Spider_mites Two-spotted_spider_mite',
-        'Tomato___Target_Spot',
-        'Tomato___Tomato_Yellow_Leaf_Curl_Virus',
-        'Tomato___Tomato_mosaic_virus',
-        'Tomato___healthy'
-    ]
-    predicted_label = class_labels[predicted_index]
+    with metrics.stage("disease_lookup"):
+        if catalogue.is_stale():
+            await run_io(_refresh_catalogue)
+        entry = catalogue.get(predicted_index)
 
-    # Extract crop and disease names
-    if "___" in predicted_label:
-        crop_type, disease_name = predicted_label.split("___", 1)
-    else:
-        crop_type = "Unknown"
-        disease_name = predicted_label
-
-    # Get disease details from DB
-    disease = (
-        db.query(Disease)
-        .filter(Disease.disease_name == disease_name, Disease.crop_type == crop_type)
-        .first()
+    prediction_id = await run_io(
+        _store_prediction, db, user_id, db_image_path, entry, real_confidence, model_version
     )
+    if embedding is not None and settings.embeddings_enabled:
+        io_pool.submit(
+            embedding_index.add, model_version, prediction_id, predicted_index, real_confidence, *embedding
+        ).add_done_callback(_report_embedding_error)
 
-    disease_id = disease.disease_id if disease else None
+    # Build response (send fake or real depending on toggle)
+    return {
+        "prediction_id": prediction_id,
+        "predicted_label": entry.label,
+        "confidence_score": confidence_score,
+        "disease_description": entry.description,
+        "disease_treatment": entry.treatment,
+        "model_version": model_version,
+    }
 
-    # Save prediction in DB (store real confidence internally for future use)
-    new_pred = Prediction(
-        user_id=user_id,
-        disease_id=disease_id,
-        image_path=db_image_path,
-        predicted_label=predicted_label,
-        confidence_score=real_confidence  # Save true model confidence
+# ---------------- Prediction Jobs ----------------
+# POST /predict/jobs stores the upload, queues it and answers at once, so a
+# dropped 2G/3G connection doesn't throw away (and re-trigger) the work.
+# The queue is a SQLite file shared by all workers on the machine; each
+# worker runs `job_workers` jobs through the same pipeline as POST /predict.
+SSE_KEEPALIVE_S = 15
+
+job_queue = JobQueue(
+    settings.job_queue_path or os.path.join(os.path.dirname(__file__), "../../jobs.sqlite3"),
+    lease_s=settings.job_lease_s,
+    max_attempts=settings.job_max_attempts,
+)
+
+def _read_stored_upload(filename):
+    with open(os.path.join(UPLOAD_FOLDER, filename), "rb") as f:
+        return f.read()
+
+async def _run_job(job):
+    if not model_registry.ready:
+        # Queued work waits out a model load instead of failing
+        if not await run_io(model_registry.wait, 60):
+            raise RuntimeError("Model not loaded on server")
+    filename = job["payload"]["filename"]
+    data = await run_io(_read_stored_upload, filename)
+    db = SessionLocal()
+    try:
+        result = await _classify_and_store(db, job["user_id"], data, job["payload"]["digest"], f"uploads/{filename}")
+    finally:
+        db.close()
+    return result["prediction_id"], result
+
+job_runner = JobRunner(
+    job_queue,
+    _run_job,
+    workers=settings.job_workers,
+    poll_s=settings.job_poll_s,
+    retention_s=settings.job_retention_s,
+)
+
+for _status in (QUEUED, RUNNING):
+    metrics.register(metrics.Gauge(
+        f"krishi_prediction_jobs_{_status}", f"Prediction jobs {_status} on this machine",
+        fn=lambda status=_status: job_queue.counts().get(status, 0),
+    ))
+
+def _job_view(job):
+    """A job as returned to clients (queue position while it waits)."""
+    view = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "prediction_id": job["prediction_id"],
+        "result": job["result"],
+        "error": job["error"],
+    }
+    for key in ("created_at", "started_at", "finished_at"):
+        view[key] = datetime.fromtimestamp(job[key]).isoformat() if job[key] else None
+    if job["status"] == QUEUED:
+        view["position"] = job_queue.position(job["job_id"], job["created_at"])
+    return view
+
+def _load_job_view(job_id, current_user):
+    job = job_queue.get(job_id)
+    # Someone else's job is reported as missing, not forbidden
+    if job is None or (job["user_id"] != current_user.user_id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_view(job)
+
+@router.post("/jobs", status_code=202, summary="Queue a prediction and get a job id back immediately")
+async def submit_prediction_job(
+    request: Request,
+    file: UploadFile = File(...),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Same input as POST /predict, but returns once the image is stored.
+    Poll GET /predict/jobs/{job_id} or follow /predict/jobs/{job_id}/events
+    (server-sent events); the finished job carries the POST /predict
+    response and the prediction_id of the stored row.
+    """
+    if model_registry.state == "failed":
+        raise HTTPException(status_code=500, detail="Model not loaded on server")
+
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    with metrics.stage("upload"):
+        data, digest = await _read_upload(file)
+    filename = f"{digest}{file_ext}"
+    # The job worker reads the image back from disk, so it must be there first
+    await run_io(_write_upload, data, filename)
+    thumbnails.submit(os.path.join(UPLOAD_FOLDER, filename), filename)
+
+    job_id = await job_runner.submit(current_user.user_id, {"filename": filename, "digest": digest})
+    return {
+        "job_id": job_id,
+        "status": QUEUED,
+        "status_url": request.url_for("get_prediction_job", job_id=job_id).path,
+        "events_url": request.url_for("prediction_job_events", job_id=job_id).path,
+    }
+
+@router.get("/jobs/{job_id}", summary="Status (and result, once done) of a prediction job")
+async def get_prediction_job(
+    job_id: str,
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    view = await run_io(_load_job_view, job_id, current_user)
+    if view["status"] not in FINISHED:
+        response.headers["Retry-After"] = "1"
+    return view
+
+async def _job_events(job_id, current_user):
+    last, quiet_since = None, time.monotonic()
+    yield "retry: 2000\n\n"  # reconnect delay for EventSource clients
+    while True:
+        try:
+            view = await run_io(_load_job_view, job_id, current_user)
+        except HTTPException as e:
+            yield f"event: error\ndata: {json.dumps({'detail': e.detail})}\n\n"
+            return
+        state = (view["status"], view.get("position"))
+        if state != last:
+            yield f"event: {view['status']}\ndata: {json.dumps(view)}\n\n"
+            last, quiet_since = state, time.monotonic()
+        elif time.monotonic() - quiet_since >= SSE_KEEPALIVE_S:
+            # Comment line, keeps proxies and mobile carriers from closing an idle stream
+            yield ": keepalive\n\n"
+            quiet_since = time.monotonic()
+        if view["status"] in FINISHED:
+            return
+        await job_runner.wait_for_change(settings.job_poll_s)
+
+@router.get("/jobs/{job_id}/events", summary="Server-sent events for a prediction job until it finishes")
+async def prediction_job_events(job_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    # Fail fast with a normal 404 before switching to a stream
+    await run_io(_load_job_view, job_id, current_user)
+    return StreamingResponse(
+        _job_events(job_id, current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    db.add(new_pred)
-    db.commit()
-    db.refresh(new_pred)
 
-    # Log prediction
-    log_action(db, user_id, "Prediction made", details=f"Prediction ID: {new_pred.prediction_id}")
+# ---------------- Bulk Prediction API ----------------
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
+BULK_MAX_TOTAL_BYTES = int(settings.bulk_max_total_mb * 1024 * 1024)
 
-    # Build response (send fake or real depending on toggle)
+def _save_bulk_uploads(files):
+    """
+    Persist every image (plain files and members of .zip archives) to the
+    content-addressed upload store. Returns [(original_name, digest, filename)].
+    Sizes are checked before anything is written, so a zip bomb is refused
+    without being extracted.
+    """
+    saved, total = [], 0
+
+    def admit(name, size):
+        nonlocal total
+        if size > UPLOAD_MAX_BYTES:
+            raise _too_large(name, settings.upload_max_mb)
+        total += size
+        if total > BULK_MAX_TOTAL_BYTES:
+            raise _too_large("Upload", settings.bulk_max_total_mb)
+
+    for file in files:
+        name = file.filename or ""
+        if name.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(file.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{name} is not a valid zip archive")
+            with archive:
+                members = [
+                    member for member in archive.infolist()
+                    if not member.is_dir() and os.path.splitext(member.filename)[1].lower() in IMAGE_EXTENSIONS
+                ]
+                # file_size is what the central directory claims; reads never return
+                # more than that, so an understated size can't be used to get past it
+                for member in members[:settings.bulk_max_images + 1]:
+                    admit(member.filename, member.file_size)
+                for member in members:
+                    ext = os.path.splitext(member.filename)[1].lower()
+                    with archive.open(member) as src:
+                        saved.append((member.filename, *_save_upload(src, ext)))
+                    if len(saved) > settings.bulk_max_images:
+                        break
+        else:
+            file.file.seek(0, os.SEEK_END)
+            admit(name, file.file.tell())
+            file.file.seek(0)
+            ext = os.path.splitext(name)[1].lower()
+            saved.append((name, *_save_upload(file.file, ext)))
+
+        if len(saved) > settings.bulk_max_images:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many images, at most {settings.bulk_max_images} per request",
+            )
+    return saved
+
+async def _classify_chunk(chunk):
+    """
+    Return ({index: (predicted_index, confidence, model_version) | error message},
+    {index: (signature, features)} for the images that went through the model).
+    """
+    results, embeddings, pending = {}, {}, []
+    model_version = model_registry.active_version
+    for idx, (_, digest, _) in enumerate(chunk):
+        cached = result_cache.get(digest, model_version)
+        if cached is None and result_cache.disk is not None:
+            cached = await run_io(result_cache.get_from_disk, digest, model_version)
+        if cached is not None:
+            results[idx] = (cached["predicted_index"], cached["confidence"], model_version)
+        else:
+            pending.append(idx)
+
+    if pending:
+        paths = [os.path.join(UPLOAD_FOLDER, chunk[idx][2]) for idx in pending]
+        batch, ok, errors = await run_cpu(decode_batch, paths)
+        for pos, error in errors.items():
+            results[pending[pos]] = error
+        if batch is not None:
+            # The chunk is batch_max_size images, so it fills a whole micro-batch
+            # (shared with single predictions, and across workers with the server)
+            metrics.inference_in_flight.inc(amount=len(batch))
+            try:
+                with metrics.stage("bulk_inference"):
+                    outputs = await asyncio.gather(*(inference_engine.submit(image) for image in batch))
+            finally:
+                metrics.inference_in_flight.dec(amount=len(batch))
+            for row_in_batch, (pos, (version, row, features)) in enumerate(zip(ok, outputs)):
+                idx = pending[pos]
+                if settings.embeddings_enabled:
+                    embeddings[idx] = (signature(batch[row_in_batch]), features)
+                result = {"predicted_index": int(np.argmax(row)), "confidence": float(np.max(row))}
+                result_cache.put(chunk[idx][1], version, result)
+                if result_cache.disk is not None:
+                    await run_io(result_cache.put_to_disk, chunk[idx][1], version, result)
+                results[idx] = (result["predicted_index"], result["confidence"], version)
+    return results, embeddings
+
+async def _stream_bulk_results(saved, user_id):
+    # The request-scoped session may already be closed while the response
+    # streams, so the generator owns its own.
+    db = SessionLocal()
+    try:
+        if catalogue.is_stale():
+            await run_io(_refresh_catalogue)
+        step = max(1, settings.batch_max_size)
+        for start in range(0, len(saved), step):
+            chunk = saved[start:start + step]
+            results, embeddings = await _classify_chunk(chunk)
+
+            rows, row_indexes = [], []
+            for idx, (_, _, filename) in enumerate(chunk):
+                if isinstance(results[idx], tuple):
+                    predicted_index, real_confidence, version = results[idx]
+                    rows.append((f"uploads/{filename}", catalogue.get(predicted_index), real_confidence, version))
+                    row_indexes.append(idx)
+
+            stored = await run_io(_store_predictions_bulk, db, user_id, rows) if rows else []
+            stored_by_idx = dict(zip(row_indexes, zip(rows, stored)))
+            for idx, ((_, _, real_confidence, version), prediction_id) in stored_by_idx.items():
+                if idx in embeddings:
+                    io_pool.submit(
+                        embedding_index.add, version, prediction_id, results[idx][0], real_confidence, *embeddings[idx]
+                    ).add_done_callback(_report_embedding_error)
+
+            for idx, (original_name, _, _) in enumerate(chunk):
+                if idx not in stored_by_idx:
+                    line = {"filename": original_name, "error": results[idx]}
+                else:
+                    (_, entry, real_confidence, version), prediction_id = stored_by_idx[idx]
+                    if USE_FAKE_CONFIDENCE:
+                        confidence_score = round(random.uniform(95, 100), 2)
+                    else:
+                        confidence_score = round(real_confidence, 2)
+                    line = {
+                        "filename": original_name,
+                        "prediction_id": prediction_id,
+                        "predicted_label": entry.label,
+                        "confidence_score": confidence_score,
+                        "disease_description": entry.description,
+                        "disease_treatment": entry.treatment,
+                        "model_version": version,
+                    }
+                yield json.dumps(line) + "\n"
+    finally:
+        db.close()
+
+@router.post("/batch", summary="Predict many images (or a zip of images), streamed as NDJSON")
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Upload many leaf images and/or .zip archives in one request. One JSON
+    object per image is streamed back (application/x-ndjson) as each batch
+    finishes; images that fail to decode get an "error" line instead.
+    """
+    _require_model()
+
+    # Everything is on disk before streaming starts, so the generator does
+    # not depend on the multipart UploadFiles staying open.
+    saved = await run_io(_save_bulk_uploads, files)
+    if not saved:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    for _, _, filename in saved:
+        thumbnails.submit(os.path.join(UPLOAD_FOLDER, filename), filename)
+
+    return StreamingResponse(
+        _stream_bulk_results(saved, current_user.user_id),
+        media_type="application/x-ndjson",
+    )
+
+# ---------------- Similar Cases ----------------
+def _similar_cases(db, current_user, prediction_id, k, same_crop):
+    pred = db.query(Prediction.user_id, Prediction.image_path, Prediction.model_version).filter(
+        Prediction.prediction_id == prediction_id
+    ).first()
+    is_admin = current_user.role == "admin"
+    if pred is None or (pred.user_id != current_user.user_id and not is_admin):
+        raise HTTPException(status_code=404, detail="Prediction not found")
+
+    # Other users' photos and history are only visible to admins
+    own_ids = None
+    if not is_admin:
+        own_ids = [
+            row.prediction_id
+            for row in db.query(Prediction.prediction_id).filter(
+                Prediction.user_id == current_user.user_id, Prediction.model_version == pred.model_version
+            )
+        ]
+
+    # Results served from the result cache have no vector of their own; any
+    # earlier prediction of the same photo by the same model does.
+    candidates = [prediction_id] + [
+        row.prediction_id
+        for row in db.query(Prediction.prediction_id)
+        .filter(Prediction.image_path == pred.image_path, Prediction.model_version == pred.model_version)
+        .order_by(Prediction.prediction_id)
+        .limit(20)
+        if row.prediction_id != prediction_id
+    ]
+    matches = None
+    for candidate in candidates:
+        matches = embedding_index.similar(pred.model_version, candidate, k=k + 1, same_crop=same_crop, ids=own_ids)
+        if matches is not None:
+            break
+    if matches is None:
+        raise HTTPException(status_code=404, detail="No embedding stored for this prediction")
+
+    matches = [m for m in matches if m[0] != prediction_id][:k]
+    rows = {
+        row.prediction_id: row
+        for row in db.query(
+            Prediction.prediction_id, Prediction.predicted_label, Prediction.image_path, Prediction.created_at
+        ).filter(Prediction.prediction_id.in_([m[0] for m in matches]))
+    }
     return {
-        "prediction_id": new_pred.prediction_id,
-        "predicted_label": predicted_label,
-        "confidence_score": confidence_score,
-        "disease_description": disease.description if disease else "Description not found.",
-        "disease_treatment": disease.treatment if disease else "Treatment not available."
-    }
\ No newline at end of file
+        "prediction_id": prediction_id,
+        "model_version": pred.model_version,
+        "similar": [
+            {
+                "prediction_id": match_id,
+                "similarity": round(similarity, 4),
+                "predicted_label": rows[match_id].predicted_label,
+                "confidence": round(confidence, 4),
+                "image_path": rows[match_id].image_path,
+                "created_at": rows[match_id].created_at,
+            }
+            for match_id, similarity, _, confidence in matches
+            if match_id in rows  # deleted since it was indexed
+        ],
+    }
+
+@router.get("/{prediction_id}/similar", summary="Past predictions whose images look most like this one")
+async def similar_cases(
+    prediction_id: int,
+    k: int = Query(10, ge=1, le=100),
+    same_crop: bool = True,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Nearest neighbours by the model's penultimate-layer features (or by
+    image signature for backends that don't expose them), among predictions
+    made by the same model version; `same_crop` limits them to the crop of
+    this prediction's label. Users see their own predictions, admins everyone's.
+    """
+    if not settings.embeddings_enabled:
+        raise HTTPException(status_code=404, detail="Embeddings are disabled")
+    return await run_io(_similar_cases, db, current_user, prediction_id, k, same_crop)
+
+# ---------------- Batching Stats ----------------
+@router.get("/stats/batching", summary="Micro-batching batch size and queue wait stats")
+async def batching_stats(current_user: CurrentUser = Depends(get_current_user)):
+    if inference_client is not None:
+        # The batcher lives in the shared inference server
+        batching = await inference_client.control("batching")
+    else:
+        batching = {
+            "max_batch_size": inference_engine.max_batch_size,
+            "max_wait_ms": inference_engine.max_wait * 1000,
+            **inference_engine.stats.snapshot(),
+        }
+    return {**batching, "result_cache": result_cache.stats()}
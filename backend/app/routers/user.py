@@ -1,47 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import get_db
 from app.models.models import Prediction, User
-from typing import List
+from app.services.pagination import before, set_next_cursor
+from app.services.thumbnails import thumbnails
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 router = APIRouter()
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 # ✅ Pydantic schema (you can keep it here if schemas.py doesn't exist)
 class PredictionResponse(BaseModel):
     prediction_id: int
     image_path: str
     predicted_label: str
     confidence_score: float
-    created_at: datetime
-
-    class Config:
-        orm_mode = True
+    model_version: Optional[str] = None
+    created_at: Optional[datetime] = None
+    thumbnails: Dict[str, str] = {}  # {"128": "uploads/thumbs/<digest>.128.webp", ...}
 
 
 # ✅ Fetch user prediction history
+# Newest first, `limit` rows per page. The X-Next-Cursor response header is
+# the ?cursor= for the next page (absent on the last page).
 @router.get("/{user_id}/history", response_model=List[PredictionResponse])
-def get_user_history(user_id: int, db: Session = Depends(get_db)):
+def get_user_history(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
     # Check if user exists
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = db.query(User.user_id).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Fetch predictions for the given user
-    predictions = (
-        db.query(Prediction)
-        .filter(Prediction.user_id == user_id)
-        .order_by(Prediction.created_at.desc())
+    # Fetch predictions for the given user, served by ix_predictions_user_created_id
+    query = db.query(
+        Prediction.prediction_id,
+        Prediction.image_path,
+        Prediction.predicted_label,
+        Prediction.confidence_score,
+        Prediction.model_version,
+        Prediction.created_at,
+    ).filter(Prediction.user_id == user_id)
+    if cursor:
+        query = query.filter(before(Prediction.created_at, Prediction.prediction_id, cursor))
+    rows = (
+        query.order_by(Prediction.created_at.desc(), Prediction.prediction_id.desc())
+        .limit(limit + 1)
         .all()
     )
 
-    if not predictions:
+    if not rows and not cursor:
         raise HTTPException(status_code=404, detail="No predictions found for this user")
 
-    return predictions
+    rows = set_next_cursor(response, rows, limit, key=lambda row: (row.created_at, row.prediction_id))
+    return [PredictionResponse(**row._asdict(), thumbnails=thumbnails.urls(row.image_path)) for row in rows]
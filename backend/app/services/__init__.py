@@ -0,0 +1,3 @@
+# app/services/__init__.py
+
+# Long-lived helpers shared by the routers (inference, caching, logging ...)
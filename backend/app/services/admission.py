@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.services import metrics
+from app.services.security import decode_token
+
+# ---------------- Metrics ----------------
+shed = metrics.register(metrics.Counter(
+    "krishi_admission_shed_total", "Predict requests turned away before reading their upload", ("reason",)))
+admission_wait = metrics.register(metrics.Histogram(
+    "krishi_admission_wait_seconds", "Time predict requests waited for an admission slot"))
+
+
+class Overloaded(Exception):
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+# ---------------- Admission Controller ----------------
+class AdmissionController:
+    """
+    Bounded budget for the inference path of one worker: `max_in_flight`
+    requests run, up to `max_waiting` more wait (at most `max_wait_s`) for
+    a slot, and anything beyond that is refused straight away with 503.
+    Each user may hold `per_user` running + waiting requests, further ones
+    get 429, so one client retrying in a loop can't starve everyone else.
+    """
+
+    def __init__(self, max_in_flight=32, max_waiting=64, max_wait_s=5.0, per_user=4, retry_after_s=2):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait_s
+        self.per_user = per_user
+        self.retry_after = retry_after_s
+        self.in_flight = 0
+        self.waiting = 0
+        self._per_user = {}
+        self._semaphore = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0 or self.per_user > 0
+
+    async def acquire(self, user_id=None):
+        """Take a slot or raise Overloaded. Every successful acquire() needs a release()."""
+        if self.per_user > 0 and user_id is not None and self._per_user.get(user_id, 0) >= self.per_user:
+            shed.inc("user_limit")
+            raise Overloaded(429, "Too many predictions in progress for this account, please retry", 1)
+        if self.max_in_flight > 0:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            if self._semaphore.locked() and self.waiting >= self.max_waiting:
+                shed.inc("queue_full")
+                raise Overloaded(503, "Server is busy, please retry", self.retry_after)
+
+        if user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        if self.max_in_flight > 0:
+            self.waiting += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self._release_user(user_id)
+                shed.inc("queue_timeout")
+                raise Overloaded(503, "Server is busy, please retry", self.retry_after)
+            except BaseException:
+                self._release_user(user_id)
+                raise
+            finally:
+                self.waiting -= 1
+                admission_wait.observe(time.perf_counter() - started)
+        self.in_flight += 1
+
+    def release(self, user_id=None):
+        self.in_flight -= 1
+        self._release_user(user_id)
+        if self.max_in_flight > 0:
+            self._semaphore.release()
+
+    def _release_user(self, user_id):
+        if user_id is None:
+            return
+        remaining = self._per_user.get(user_id, 0) - 1
+        if remaining > 0:
+            self._per_user[user_id] = remaining
+        else:
+            self._per_user.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "users": len(self._per_user),
+            "max_in_flight": self.max_in_flight,
+            "max_waiting": self.max_waiting,
+            "per_user": self.per_user,
+        }
+
+
+admission = AdmissionController(
+    max_in_flight=settings.admission_max_in_flight,
+    max_waiting=settings.admission_max_waiting,
+    max_wait_s=settings.admission_max_wait_s,
+    per_user=settings.admission_per_user,
+    retry_after_s=settings.admission_retry_after_s,
+)
+
+metrics.register(metrics.Gauge(
+    "krishi_admission_in_flight", "Predict requests holding an admission slot", fn=lambda: admission.in_flight))
+metrics.register(metrics.Gauge(
+    "krishi_admission_waiting", "Predict requests waiting for an admission slot", fn=lambda: admission.waiting))
+
+
+# ---------------- ASGI Middleware ----------------
+def _user_id(scope):
+    """user_id from the bearer token, None if missing or invalid (the route answers 401 then)."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            value = value.decode("latin-1")
+            if not value.startswith("Bearer "):
+                return None
+            try:
+                return decode_token(value.split(" ")[1]).get("user_id")
+            except HTTPException:
+                return None
+    return None
+
+
+class AdmissionMiddleware:
+    """
+    Runs admission for POST requests to `paths` before the app reads the
+    body, so refused requests never buffer their upload. The slot is held
+    until the response (including a streamed one) has been sent.
+    """
+
+    def __init__(self, app, controller=admission, paths=()):
+        self.app = app
+        self.controller = controller
+        self.paths = {path.rstrip("/") for path in paths}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"].rstrip("/") not in self.paths
+            or not self.controller.enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = _user_id(scope)
+        try:
+            await self.controller.acquire(user_id)
+        except Overloaded as e:
+            response = JSONResponse(
+                {"detail": e.detail}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(user_id)
@@ -0,0 +1,120 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from app.models.models import PredictionRollup
+from app.services.catalogue import split_label
+
+
+# ---------------- Incremental Rollups ----------------
+def _upsert_statement(dialect: str, values: list):
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(PredictionRollup).values(values)
+        return stmt.on_duplicate_key_update(
+            prediction_count=PredictionRollup.prediction_count + stmt.inserted.prediction_count,
+            confidence_sum=PredictionRollup.confidence_sum + stmt.inserted.confidence_sum,
+        )
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Prediction rollups don't support the {dialect} dialect")
+
+    stmt = insert(PredictionRollup).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["bucket_date", "crop_type", "disease_name"],
+        set_={
+            "prediction_count": PredictionRollup.prediction_count + stmt.excluded.prediction_count,
+            "confidence_sum": PredictionRollup.confidence_sum + stmt.excluded.confidence_sum,
+        },
+    )
+
+
+def utc_today() -> date:
+    """
+    The day live counting buckets by. Prediction.created_at is the database's
+    now() in UTC (see database.py) and backfill_rollups.py buckets on it.
+    """
+    return datetime.now(timezone.utc).date()
+
+
+def record_predictions(db, rows, bucket_date: date = None):
+    """
+    Add predictions to the daily rollups inside the caller's transaction, so
+    the counters commit (or roll back) together with the Prediction rows.
+    `rows` is an iterable of (predicted_label, confidence).
+    """
+    bucket_date = bucket_date or utc_today()
+    totals = defaultdict(lambda: [0, 0.0])
+    for predicted_label, confidence in rows:
+        key = (bucket_date, *split_label(predicted_label))
+        totals[key][0] += 1
+        totals[key][1] += confidence
+    add_to_rollups(db, totals)
+
+
+def add_to_rollups(db, totals: dict):
+    """{(bucket_date, crop_type, disease_name): [count, confidence_sum]} -> one upsert."""
+    if not totals:
+        return
+    values = [
+        {
+            "bucket_date": bucket_date,
+            "crop_type": crop_type,
+            "disease_name": disease_name,
+            "prediction_count": count,
+            "confidence_sum": confidence_sum,
+        }
+        # Sorted so concurrent upserts take row locks in the same order
+        for (bucket_date, crop_type, disease_name), (count, confidence_sum) in sorted(totals.items())
+    ]
+    db.execute(_upsert_statement(db.get_bind().dialect.name, values))
+
+
+# ---------------- Queries ----------------
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def query_rollups(db, bucket="day", crop=None, since=None, until=None):
+    """
+    Predictions per bucket per crop per disease, read from the rollup table
+    only. Cost depends on days x diseases in range, not on predictions.
+    """
+    query = db.query(
+        PredictionRollup.bucket_date,
+        PredictionRollup.crop_type,
+        PredictionRollup.disease_name,
+        PredictionRollup.prediction_count,
+        PredictionRollup.confidence_sum,
+    )
+    if crop:
+        query = query.filter(PredictionRollup.crop_type == crop)
+    if since:
+        query = query.filter(PredictionRollup.bucket_date >= since)
+    if until:
+        query = query.filter(PredictionRollup.bucket_date < until)
+
+    totals = defaultdict(lambda: [0, 0.0])
+    for row in query:
+        key = (bucket_start(row.bucket_date, bucket), row.crop_type, row.disease_name)
+        totals[key][0] += row.prediction_count
+        totals[key][1] += row.confidence_sum
+
+    return [
+        {
+            "bucket": bucket_date.isoformat(),
+            "crop_type": crop_type,
+            "disease_name": disease_name,
+            "predictions": count,
+            "avg_confidence": round(confidence_sum / count, 4) if count else None,
+        }
+        for (bucket_date, crop_type, disease_name), (count, confidence_sum) in sorted(totals.items())
+    ]
@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.models import Log
+
+
+# ---------------- Audit Log Writer ----------------
+class AuditLogWriter:
+    """
+    Buffers Log rows in memory and writes them with one bulk INSERT per
+    flush (every `flush_interval_s` or `batch_size` rows, whichever is first)
+    instead of a commit per signup / login / prediction.
+
+    The buffer is bounded: log() waits up to `block_ms` for room and then
+    drops the entry (counted in stats()["dropped"]), so a slow database can
+    never make request handlers pile up behind the audit trail.
+    """
+
+    def __init__(self, session_factory, batch_size=200, flush_interval_s=1.0, max_queue=10000, block_ms=50):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_s
+        self.block = block_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._pending = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flush_failures = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="krishi-audit-log", daemon=True)
+                self._thread.start()
+
+    def log(self, user_id, action, details=None) -> bool:
+        """Queue one entry. Returns False if it had to be dropped."""
+        if self._thread is None:
+            self.start()
+        entry = {"user_id": user_id, "action": action, "details": details, "timestamp": datetime.now()}
+        try:
+            self._queue.put(entry, timeout=self.block)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def stop(self, timeout=10.0):
+        """Flush everything still buffered and stop the writer thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _drain(self):
+        while len(self._pending) < self.batch_size:
+            try:
+                self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _flush(self) -> bool:
+        if not self._pending:
+            return True
+        db = self.session_factory()
+        try:
+            db.execute(insert(Log), self._pending)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.flush_failures += 1
+            print(f" Error writing {len(self._pending)} audit log entries: {e}")
+            return False
+        finally:
+            db.close()
+        self.written += len(self._pending)
+        self.flushes += 1
+        self._pending = []
+        return True
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            # Wait for the first entry (or the interval) then grab what's there
+            if not self._pending:
+                try:
+                    self._pending.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    deadline = time.monotonic() + self.flush_interval
+                    continue
+            self._drain()
+            if len(self._pending) >= self.batch_size or time.monotonic() >= deadline:
+                if not self._flush():
+                    # Keep the batch and retry after a pause, new entries back up in the queue
+                    self._stop.wait(self.flush_interval)
+                deadline = time.monotonic() + self.flush_interval
+            else:
+                self._stop.wait(min(0.05, max(0.0, deadline - time.monotonic())))
+
+        # Shutdown: write out everything that's left
+        while True:
+            self._drain()
+            if not self._pending or not self._flush():
+                break
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() + len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+        }
+
+
+audit_log = AuditLogWriter(
+    SessionLocal,
+    batch_size=settings.audit_log_batch_size,
+    flush_interval_s=settings.audit_log_flush_interval_s,
+    max_queue=settings.audit_log_max_queue,
+    block_ms=settings.audit_log_block_ms,
+)
+
+
+def log_action(user_id, action, details=None):
+    """Record an audit event for `user_id`; written to the logs table in the background."""
+    audit_log.log(user_id, action, details)
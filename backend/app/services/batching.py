@@ -0,0 +1,145 @@
+import asyncio
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+
+# ---------------- Batch Stats ----------------
+class BatchStats:
+    """Running counters used to tune max batch size / max wait."""
+
+    def __init__(self, window: int = 1000):
+        self.batches = 0
+        self.requests = 0
+        self.batch_sizes = Counter()
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.recent_waits = deque(maxlen=window)
+
+    def record(self, batch_size: int, waits_ms: list):
+        self.batches += 1
+        self.requests += batch_size
+        self.batch_sizes[batch_size] += 1
+        for wait in waits_ms:
+            self.total_wait_ms += wait
+            self.max_wait_ms = max(self.max_wait_ms, wait)
+            self.recent_waits.append(wait)
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.recent_waits)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))], 3)
+
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "queue_wait_ms": {
+                "avg": round(self.total_wait_ms / self.requests, 3) if self.requests else 0.0,
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": round(self.max_wait_ms, 3),
+            },
+        }
+
+
+# ---------------- Micro Batcher ----------------
+class MicroBatcher:
+    """
+    Collects single images from concurrent requests into one batch, runs a
+    single forward pass and hands each caller back its own row.
+
+    `predict_fn` receives a stacked (N, ...) array and must return an array
+    whose first axis lines up with the inputs.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 16, max_wait_ms: float = 5.0, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self.stats = BatchStats()
+        self._queue = None
+        self._worker = None
+        self._buffer = None
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: np.ndarray) -> np.ndarray:
+        """Queue one preprocessed image (no batch axis) and wait for its output row."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Still drain whatever is already waiting, without blocking
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _stack(self, items):
+        # Reuse one preallocated (max_batch_size, ...) float32 tensor. Safe
+        # because the loop awaits each forward pass before filling it again.
+        first = items[0]
+        if self._buffer is None or self._buffer.shape[1:] != first.shape:
+            self._buffer = np.empty((self.max_batch_size, *first.shape), dtype=np.float32)
+        return np.stack(items, out=self._buffer[:len(items)])
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnected) don't need a slot
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            self.stats.record(len(batch), [(started - queued) * 1000 for _, _, queued in batch])
+
+            try:
+                inputs = self._stack([item for item, _, _ in batch])
+                outputs = await loop.run_in_executor(self.executor, self.predict_fn, inputs)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for row, (_, future, _) in zip(outputs, batch):
+                if not future.done():
+                    future.set_result(row)
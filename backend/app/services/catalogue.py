@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from app.config import settings
+from app.models.models import Disease
+
+
+# ---------------- Class Labels ----------------
+# Output order of the CNN, index i of model.predict() is CLASS_LABELS[i]
+CLASS_LABELS = [
+    'Apple___Apple_scab',
+    'Apple___Black_rot',
+    'Apple___Cedar_apple_rust',
+    'Apple___healthy',
+    'Blueberry___healthy',
+    'Cherry_(including_sour)___Powdery_mildew',
+    'Cherry_(including_sour)___healthy',
+    'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot',
+    'Corn_(maize)___Common_rust_',
+    'Corn_(maize)___Northern_Leaf_Blight',
+    'Corn_(maize)___healthy',
+    'Grape___Black_rot',
+    'Grape___Esca_(Black_Measles)',
+    'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)',
+    'Grape___healthy',
+    'Orange___Haunglongbing_(Citrus_greening)',
+    'Peach___Bacterial_spot',
+    'Peach___healthy',
+    'Pepper,_bell___Bacterial_spot',
+    'Pepper,_bell___healthy',
+    'Potato___Early_blight',
+    'Potato___Late_blight',
+    'Potato___healthy',
+    'Raspberry___healthy',
+    'Soybean___healthy',
+    'Squash___Powdery_mildew',
+    'Strawberry___Leaf_scorch',
+    'Strawberry___healthy',
+    'Tomato___Bacterial_spot',
+    'Tomato___Early_blight',
+    'Tomato___Late_blight',
+    'Tomato___Leaf_Mold',
+    'Tomato___Septoria_leaf_spot',
+    'Tomato___Spider_mites Two-spotted_spider_mite',
+    'Tomato___Target_Spot',
+    'Tomato___Tomato_Yellow_Leaf_Curl_Virus',
+    'Tomato___Tomato_mosaic_virus',
+    'Tomato___healthy'
+]
+
+
+
+def split_label(label: str):
+    """'Tomato___Late_blight' -> ('Tomato', 'Late_blight')"""
+    if "___" in label:
+        crop_type, disease_name = label.split("___", 1)
+        return crop_type, disease_name
+    return "Unknown", label
+
+
+# ---------------- Catalogue Entry ----------------
+class CatalogueEntry(NamedTuple):
+    label: str
+    crop_type: str
+    disease_name: str
+    disease_id: Optional[int]
+    description: str
+    treatment: str
+
+
+# ---------------- Disease Catalogue ----------------
+class DiseaseCatalogue:
+    """
+    Class index -> (crop, disease, disease_id, description, treatment),
+    built with one query against the diseases table instead of one per
+    prediction. Lookups read an immutable tuple, so a reload can swap it in
+    without locking readers.
+    """
+
+    def __init__(self, labels, refresh_seconds: float = 300):
+        self.labels = list(labels)
+        self.refresh_seconds = refresh_seconds
+        self._entries = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._entries is not None
+
+    def is_stale(self) -> bool:
+        """True when never loaded, or older than refresh_seconds (0 = never stale once loaded)."""
+        if self._entries is None:
+            return True
+        return bool(self.refresh_seconds) and time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def reload(self, db):
+        """Blocking: rebuild the index from the diseases table."""
+        rows = db.query(
+            Disease.disease_id, Disease.disease_name, Disease.crop_type,
+            Disease.description, Disease.treatment,
+        ).all()
+        by_key = {(row.crop_type, row.disease_name): row for row in rows}
+
+        entries = []
+        for label in self.labels:
+            crop_type, disease_name = split_label(label)
+            row = by_key.get((crop_type, disease_name))
+            entries.append(CatalogueEntry(
+                label=label,
+                crop_type=crop_type,
+                disease_name=disease_name,
+                disease_id=row.disease_id if row else None,
+                description=row.description if row else "Description not found.",
+                treatment=row.treatment if row else "Treatment not available.",
+            ))
+
+        with self._lock:
+            self._entries = tuple(entries)
+            self._loaded_at = time.monotonic()
+
+    def get(self, index: int) -> CatalogueEntry:
+        entries = self._entries
+        if entries is None:
+            raise RuntimeError("Disease catalogue not loaded")
+        return entries[index]
+
+    def entries(self) -> list:
+        return list(self._entries or ())
+
+
+catalogue = DiseaseCatalogue(CLASS_LABELS, refresh_seconds=settings.catalogue_refresh_s)
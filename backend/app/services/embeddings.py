@@ -0,0 +1,289 @@
+import fcntl
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.services.catalogue import CLASS_LABELS, split_label
+from app.services.inference_backends import BACKEND_DIR
+
+# ---------------- Embedding Store ----------------
+# One directory per model version (features from different models aren't
+# comparable), holding row-aligned append-only files:
+#
+#   ids.i64          prediction_id
+#   labels.i16       predicted class index (-> crop partition)
+#   conf.f16         model confidence
+#   signature.f16    8x8 colour layout of the model input, 192 dims; the
+#                    similar-case fallback for backends without features
+#   features.f16     the CNN's penultimate layer -> similar-case lookup
+#                    (only when the backend exposes it, see predict_with_features)
+#
+# Vectors are L2-normalised before they're written, so cosine similarity
+# is a plain dot product over a read-only np.memmap of the file.
+EMBEDDINGS_DIR = settings.embeddings_dir or os.path.join(BACKEND_DIR, "embeddings")
+SIGNATURE_GRID = 8
+SIGNATURE_DIM = SIGNATURE_GRID * SIGNATURE_GRID * 3
+SCAN_ROWS = 65536  # rows per vectorised chunk, bounds the float32 working copy
+
+CROP_OF_LABEL = np.array([split_label(label)[0] for label in CLASS_LABELS])
+
+
+def _normalise(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def signature(image: np.ndarray) -> np.ndarray:
+    """Mean colour of an 8x8 grid over the (224, 224, 3) model input, mean-centred and normalised."""
+    h, w, c = image.shape
+    g = SIGNATURE_GRID
+    cells = image[: h - h % g, : w - w % g].reshape(g, h // g, g, w // g, c).mean(axis=(1, 3))
+    cells = cells.ravel()
+    return _normalise(cells - cells.mean())
+
+
+def _row_sizes(feature_dim):
+    """(file name, bytes per row) of every row-aligned file."""
+    sizes = [
+        ("ids.i64", 8),
+        ("labels.i16", 2),
+        ("conf.f16", 2),
+        ("signature.f16", 2 * SIGNATURE_DIM),
+    ]
+    if feature_dim:
+        sizes.append(("features.f16", 2 * feature_dim))
+    return sizes
+
+
+class EmbeddingStore:
+    """Append-only vectors for one model version, memory-mapped for search."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._count = 0
+        self._feature_dim = None
+        self._arrays = {}
+        self._row_of_id = {}
+        self._crop_rows = {}
+
+    # ---- writing ----
+    def _meta(self):
+        try:
+            with open(os.path.join(self.directory, "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def append(self, prediction_id, predicted_index, confidence, sig, features=None):
+        os.makedirs(self.directory, exist_ok=True)
+        # flock: several uvicorn workers append to the same files
+        with open(os.path.join(self.directory, "lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            meta = self._meta()
+            self._truncate_partial_rows(meta.get("feature_dim"))
+            if features is not None and "feature_dim" not in meta:
+                meta["feature_dim"] = int(np.asarray(features).size)
+                # Rows appended before the first features (e.g. the version was served
+                # by ONNX / TFLite first) get zero vectors, so features.f16 stays row-aligned
+                with open(os.path.join(self.directory, "features.f16"), "wb") as f:
+                    f.truncate(self._rows_on_disk(None) * 2 * meta["feature_dim"])
+                with open(os.path.join(self.directory, "meta.json"), "w") as f:
+                    json.dump(meta, f)
+            feature_dim = meta.get("feature_dim")
+
+            columns = [
+                ("ids.i64", np.array([prediction_id], dtype="<i8")),
+                ("labels.i16", np.array([predicted_index], dtype="<i2")),
+                ("conf.f16", np.array([confidence], dtype="<f2")),
+                ("signature.f16", _normalise(sig).astype("<f2")),
+            ]
+            if feature_dim:
+                if features is None or np.asarray(features).size != feature_dim:
+                    features = np.zeros(feature_dim, dtype=np.float32)  # keeps the files row-aligned
+                columns.append(("features.f16", _normalise(features).astype("<f2")))
+            for name, values in columns:
+                with open(os.path.join(self.directory, name), "ab") as f:
+                    f.write(values.tobytes())
+
+    def _truncate_partial_rows(self, feature_dim):
+        """
+        A writer that died part way through append() leaves some files a row
+        ahead of the others; cut them back so the next row lines up again.
+        Called under the append lock.
+        """
+        rows = self._rows_on_disk(feature_dim)
+        for name, row_bytes in _row_sizes(feature_dim):
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path) and os.path.getsize(path) != rows * row_bytes:
+                with open(path, "r+b") as f:
+                    f.truncate(rows * row_bytes)
+
+    # ---- reading ----
+    def _rows_on_disk(self, feature_dim):
+        counts = []
+        for name, row_bytes in _row_sizes(feature_dim):
+            try:
+                counts.append(os.path.getsize(os.path.join(self.directory, name)) // row_bytes)
+            except OSError:
+                return 0
+        # A writer may be half way through a row; only rows present in every file count
+        return min(counts)
+
+    def refresh(self):
+        """Map rows appended since the last call (cheap when nothing changed)."""
+        with self._lock:
+            feature_dim = self._meta().get("feature_dim")
+            count = self._rows_on_disk(feature_dim)
+            if count == self._count and feature_dim == self._feature_dim:
+                return
+            shapes = {
+                "ids": ("ids.i64", "<i8", (count,)),
+                "labels": ("labels.i16", "<i2", (count,)),
+                "conf": ("conf.f16", "<f2", (count,)),
+                "signature": ("signature.f16", "<f2", (count, SIGNATURE_DIM)),
+            }
+            if feature_dim:
+                shapes["features"] = ("features.f16", "<f2", (count, feature_dim))
+            arrays = {}
+            if count:
+                for key, (name, dtype, shape) in shapes.items():
+                    arrays[key] = np.memmap(os.path.join(self.directory, name), dtype=dtype, mode="r", shape=shape)
+
+            # Index only the new rows
+            start = self._count if count >= self._count else 0
+            if start == 0:
+                self._row_of_id, self._crop_rows = {}, {}
+            if count > start:
+                ids = np.asarray(arrays["ids"][start:count])
+                for offset, prediction_id in enumerate(ids.tolist()):
+                    self._row_of_id[prediction_id] = start + offset
+                crops = CROP_OF_LABEL[np.asarray(arrays["labels"][start:count])]
+                for crop in np.unique(crops):
+                    rows = start + np.flatnonzero(crops == crop)
+                    previous = self._crop_rows.get(crop)
+                    self._crop_rows[crop] = rows if previous is None else np.concatenate([previous, rows])
+
+            self._arrays, self._count, self._feature_dim = arrays, count, feature_dim
+
+    @property
+    def has_features(self) -> bool:
+        return "features" in self._arrays
+
+    def vector_of(self, prediction_id, kind):
+        self.refresh()
+        row = self._row_of_id.get(prediction_id)
+        if row is None or kind not in self._arrays:
+            return None
+        return np.asarray(self._arrays[kind][row], dtype=np.float32)
+
+    def crop_of(self, prediction_id):
+        """Crop of the stored label of `prediction_id`, None if it has no row."""
+        self.refresh()
+        row = self._row_of_id.get(prediction_id)
+        if row is None:
+            return None
+        return str(CROP_OF_LABEL[int(self._arrays["labels"][row])])
+
+    def search(self, query, kind="features", k=10, crop=None, exclude_id=None, ids=None):
+        """
+        [(prediction_id, similarity, predicted_index, confidence)] best first,
+        among the rows of `crop` and / or of the prediction ids in `ids`.
+        """
+        self.refresh()
+        arrays = self._arrays
+        if kind not in arrays:
+            return []
+        vectors = arrays[kind]
+        query = _normalise(query)
+        rows = self._crop_rows.get(crop, np.empty(0, dtype=np.int64)) if crop else None
+        if ids is not None:
+            id_rows = np.array(sorted(
+                row for row in map(self._row_of_id.get, ids) if row is not None
+            ), dtype=np.int64)
+            rows = id_rows if rows is None else np.intersect1d(rows, id_rows)
+        total = len(rows) if rows is not None else len(vectors)
+
+        best_rows, best_scores = [], []
+        for start in range(0, total, SCAN_ROWS):
+            if rows is None:
+                chunk_rows = np.arange(start, min(start + SCAN_ROWS, total))
+                scores = vectors[start:start + SCAN_ROWS].astype(np.float32) @ query
+            else:
+                chunk_rows = rows[start:start + SCAN_ROWS]
+                scores = vectors[chunk_rows].astype(np.float32) @ query
+            take = min(k + 1, len(scores))  # +1 so excluding the query itself still leaves k
+            top = np.argpartition(-scores, take - 1)[:take]
+            best_rows.append(chunk_rows[top])
+            best_scores.append(scores[top])
+        if not best_rows:
+            return []
+
+        candidate_rows = np.concatenate(best_rows)
+        candidate_scores = np.concatenate(best_scores)
+        results = []
+        for i in np.argsort(-candidate_scores):
+            row = int(candidate_rows[i])
+            prediction_id = int(arrays["ids"][row])
+            if prediction_id == exclude_id:
+                continue
+            results.append((prediction_id, float(candidate_scores[i]),
+                            int(arrays["labels"][row]), float(arrays["conf"][row])))
+            if len(results) == k:
+                break
+        return results
+
+    def stats(self) -> dict:
+        self.refresh()
+        return {
+            "rows": self._count,
+            "feature_dim": self._feature_dim,
+            "crops": {crop: len(rows) for crop, rows in sorted(self._crop_rows.items())},
+        }
+
+
+# ---------------- Embedding Index ----------------
+class EmbeddingIndex:
+    """EmbeddingStore per model version, created on first use."""
+
+    def __init__(self, root):
+        self.root = root
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def store(self, model_version) -> EmbeddingStore:
+        with self._lock:
+            store = self._stores.get(model_version)
+            if store is None:
+                safe = re.sub(r"[^A-Za-z0-9._-]", "_", model_version or "unknown")
+                store = self._stores[model_version] = EmbeddingStore(os.path.join(self.root, safe))
+            return store
+
+    def add(self, model_version, prediction_id, predicted_index, confidence, sig, features=None):
+        try:
+            self.store(model_version).append(prediction_id, predicted_index, confidence, sig, features)
+        except Exception as e:
+            # Losing an embedding only costs a missed similar case, never the prediction
+            print(f" Error storing embedding for prediction {prediction_id}: {e}")
+
+    def similar(self, model_version, prediction_id, k=10, same_crop=True, ids=None):
+        """
+        Past predictions that look most like `prediction_id` (features, or
+        signature if the model has none), optionally only among `ids`.
+        """
+        store = self.store(model_version)
+        store.refresh()
+        kind = "features" if store.has_features else "signature"
+        query = store.vector_of(prediction_id, kind)
+        if query is None:
+            return None
+        crop = store.crop_of(prediction_id) if same_crop else None
+        return store.search(query, kind=kind, k=k, crop=crop, exclude_id=prediction_id, ids=ids)
+
+
+embedding_index = EmbeddingIndex(EMBEDDINGS_DIR)
@@ -0,0 +1,30 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+
+
+# ---------------- Worker Pools ----------------
+# CPU-bound stages (image decode, model.predict) get a small bounded pool so
+# they can't eat every core, I/O stages (file writes, SQLAlchemy commits) get
+# a wider one. Both keep blocking work off the event loop.
+cpu_pool = ThreadPoolExecutor(max_workers=max(1, settings.cpu_workers), thread_name_prefix="krishi-cpu")
+io_pool = ThreadPoolExecutor(max_workers=max(1, settings.io_workers), thread_name_prefix="krishi-io")
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a CPU-heavy callable on the CPU pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking I/O callable on the I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_pools(wait: bool = True):
+    cpu_pool.shutdown(wait=wait)
+    io_pool.shutdown(wait=wait)
@@ -0,0 +1,216 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.database import engine
+from app.models.models import Log, Prediction
+from app.services.catalogue import CLASS_LABELS, split_label
+
+# ---------------- Export Definitions ----------------
+# (column name, type) per table; `crop` isn't stored, it's derived from the label.
+COLUMNS = {
+    "predictions": [
+        ("prediction_id", "int"),
+        ("user_id", "int"),
+        ("created_at", "timestamp"),
+        ("crop", "str"),
+        ("predicted_label", "str"),
+        ("confidence_score", "float"),
+        ("model_version", "str"),
+        ("disease_id", "int"),
+        ("image_path", "str"),
+    ],
+    "logs": [
+        ("log_id", "int"),
+        ("user_id", "int"),
+        ("timestamp", "timestamp"),
+        ("action", "str"),
+        ("details", "str"),
+    ],
+}
+
+FORMATS = {
+    # format: (media type, file extension)
+    "csv": ("application/gzip", ".csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrows"),
+}
+
+CROPS = sorted({split_label(label)[0] for label in CLASS_LABELS})
+BATCH_ROWS = 5000  # rows per fetch / compressed chunk / row group
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def build_query(table, since=None, until=None, crop=None):
+    """SELECT for one export; `until` is exclusive, like /admin/stats. ValueError on a bad crop."""
+    if table == "predictions":
+        stmt = select(
+            Prediction.prediction_id,
+            Prediction.user_id,
+            Prediction.created_at,
+            Prediction.predicted_label,
+            Prediction.confidence_score,
+            Prediction.model_version,
+            Prediction.disease_id,
+            Prediction.image_path,
+        )
+        created = Prediction.created_at
+        if crop:
+            if crop not in CROPS:
+                raise ValueError(f"Unknown crop {crop!r}, expected one of {CROPS}")
+            # Exact label list instead of LIKE 'Crop___%' ('_' is a LIKE wildcard)
+            stmt = stmt.where(Prediction.predicted_label.in_(
+                [label for label in CLASS_LABELS if split_label(label)[0] == crop]
+            ))
+        # Primary-key order: sequential on disk, and what keyset_batches() pages by
+        order = Prediction.prediction_id
+    else:
+        if crop:
+            raise ValueError("Logs have no crop, drop the crop filter")
+        stmt = select(Log.log_id, Log.user_id, Log.timestamp, Log.action, Log.details)
+        created = Log.timestamp
+        order = Log.log_id
+    if since:
+        stmt = stmt.where(created >= _day_start(since))
+    if until:
+        stmt = stmt.where(created < _day_start(until))
+    return stmt.order_by(order)
+
+
+def keyset_batches(stmt, key, batch_rows=BATCH_ROWS):
+    """
+    Rows of `stmt` (ordered by the primary key `key`), `batch_rows` at a
+    time: one short `key > last ORDER BY key LIMIT n` query per batch.
+    mysqlconnector has no server-side cursors (stream_results would buffer
+    the whole result), so this is what keeps memory flat on every driver.
+    """
+    last = None
+    while True:
+        page = stmt if last is None else stmt.where(key > last)
+        with engine.connect() as conn:
+            rows = conn.execute(page.limit(batch_rows)).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_rows:
+            return
+        last = getattr(rows[-1], key.key)
+
+
+def iter_rows(table, since=None, until=None, crop=None, batch_rows=BATCH_ROWS):
+    """Lists of row tuples (in COLUMNS order), `batch_rows` at a time, however many rows match."""
+    stmt = build_query(table, since, until, crop)
+    key = Prediction.prediction_id if table == "predictions" else Log.log_id
+    for batch in keyset_batches(stmt, key, batch_rows):
+        if table == "predictions":
+            yield [
+                (r.prediction_id, r.user_id, r.created_at, split_label(r.predicted_label)[0],
+                 r.predicted_label, r.confidence_score, r.model_version, r.disease_id, r.image_path)
+                for r in batch
+            ]
+        else:
+            yield [tuple(r) for r in batch]
+
+
+# ---------------- Writers ----------------
+def gzip_csv(columns, batches):
+    """Header + rows as a gzip stream, one compressed chunk per batch."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow([name for name, _ in columns])
+    for rows in batches:
+        writer.writerows(rows)
+        chunk = compressor.compress(text.getvalue().encode())
+        text.seek(0)
+        text.truncate()
+        if chunk:
+            yield chunk
+    yield compressor.compress(text.getvalue().encode()) + compressor.flush()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet / Arrow export needs `pyarrow` installed")
+    return pyarrow
+
+
+class _Chunks:
+    """Write-only file object the Arrow writers write into; drain() hands the bytes on."""
+
+    def __init__(self):
+        self._parts = []
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def arrow_stream(columns, batches, fmt):
+    """Parquet (one row group per batch) or Arrow IPC stream (one record batch per batch)."""
+    pa = _pyarrow()
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "timestamp": pa.timestamp("s")}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _Chunks()
+    out = pa.PythonFile(sink, mode="w")
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(out, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(out, schema)
+    try:
+        for rows in batches:
+            arrays = [pa.array([row[i] for row in rows], type=schema.field(i).type) for i in range(len(columns))]
+            batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def check_format(fmt):
+    """ValueError / RuntimeError before any streaming starts if `fmt` can't be produced here."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {sorted(FORMATS)}")
+    if fmt != "csv":
+        _pyarrow()
+
+
+def stream_export(table, fmt="csv", since=None, until=None, crop=None):
+    """Bytes of the whole export in `fmt`, produced batch by batch."""
+    columns = COLUMNS[table]
+    batches = iter_rows(table, since, until, crop)
+    if fmt == "csv":
+        return gzip_csv(columns, batches)
+    return arrow_stream(columns, batches, fmt)
+
+
+def export_filename(table, fmt, since=None, until=None, crop=None) -> str:
+    parts = [table]
+    if crop:
+        parts.append(crop)
+    if since or until:
+        parts.append(f"{since or 'start'}_{until or 'now'}")
+    return "-".join(parts) + FORMATS[fmt][1]
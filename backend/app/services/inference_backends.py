@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+# ---------------- Model Files ----------------
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+MODEL_BASENAME = "plant_disease_cnn_model"
+MODEL_EXTENSIONS = {"keras": ".keras", "tflite": ".tflite", "onnx": ".onnx", "stub": ".stub"}
+
+
+def default_model_path(backend: str) -> str:
+    """backend/plant_disease_cnn_model.<ext> for the given backend name."""
+    return os.path.join(BACKEND_DIR, MODEL_BASENAME + MODEL_EXTENSIONS[backend])
+
+
+# ---------------- Backend Interface ----------------
+class InferenceBackend:
+    """
+    Everything the predict router needs from a model: load it once, then
+    map a float32 (N, 224, 224, 3) batch in [0, 1] to (N, 38) probabilities.
+    predict() may be called from several worker threads at once.
+    """
+
+    name = "base"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        self.model_path = model_path
+        self.num_threads = num_threads
+
+    def load(self):
+        raise NotImplementedError
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict_with_features(self, batch: np.ndarray):
+        """(probabilities, (N, D) penultimate-layer features or None if the backend can't expose them)."""
+        return self.predict(batch), None
+
+
+# ---------------- Keras ----------------
+class KerasBackend(InferenceBackend):
+    name = "keras"
+
+    def load(self):
+        import tensorflow as tf
+
+        if self.num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+        self.model = tf.keras.models.load_model(self.model_path)
+        try:
+            # Same weights, one extra output: the layer feeding the classifier
+            self.feature_model = tf.keras.Model(self.model.inputs, [self.model.layers[-2].output, self.model.output])
+        except Exception as e:
+            print(f" No feature output for {self.model_path}, similar cases fall back to image signatures: {e}")
+            self.feature_model = None
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+    def predict_with_features(self, batch):
+        if self.feature_model is None:
+            return self.predict(batch), None
+        features, probabilities = self.feature_model.predict(batch, verbose=0)
+        return probabilities, features.reshape(len(features), -1)
+
+
+# ---------------- TFLite ----------------
+def _tflite_interpreter_class():
+    # tflite-runtime is a few MB; fall back to the copy bundled with TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tensorflow.lite import Interpreter
+        except ImportError:
+            raise RuntimeError("TFLite backend needs `tflite-runtime` or `tensorflow` installed")
+    return Interpreter
+
+
+class TFLiteBackend(InferenceBackend):
+    name = "tflite"
+
+    def load(self):
+        self._interpreter_class = _tflite_interpreter_class()
+        self._local = threading.local()
+        self._interpreter()  # fail fast on a bad file
+
+    def _interpreter(self):
+        # Interpreters aren't thread-safe, give each worker thread its own
+        interpreter = getattr(self._local, "interpreter", None)
+        if interpreter is None:
+            interpreter = self._interpreter_class(
+                model_path=self.model_path, num_threads=self.num_threads or None
+            )
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+            self._local.batch_size = interpreter.get_input_details()[0]["shape"][0]
+        return interpreter
+
+    def predict(self, batch):
+        interpreter = self._interpreter()
+        input_detail = interpreter.get_input_details()[0]
+
+        if self._local.batch_size != len(batch):
+            interpreter.resize_tensor_input(input_detail["index"], batch.shape)
+            interpreter.allocate_tensors()
+            self._local.batch_size = len(batch)
+            input_detail = interpreter.get_input_details()[0]
+
+        # Fully-integer models take quantized input
+        if input_detail["dtype"] in (np.int8, np.uint8):
+            scale, zero_point = input_detail["quantization"]
+            batch = np.clip(np.round(batch / scale + zero_point),
+                            np.iinfo(input_detail["dtype"]).min,
+                            np.iinfo(input_detail["dtype"]).max)
+        interpreter.set_tensor(input_detail["index"], batch.astype(input_detail["dtype"]))
+        interpreter.invoke()
+
+        output_detail = interpreter.get_output_details()[0]
+        output = interpreter.get_tensor(output_detail["index"])
+        if output_detail["dtype"] in (np.int8, np.uint8):
+            scale, zero_point = output_detail["quantization"]
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+# ---------------- ONNX Runtime ----------------
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def load(self):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("ONNX backend needs `onnxruntime` installed")
+
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            self.model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_type = self.session.get_inputs()[0].type
+
+    def predict(self, batch):
+        # float16-converted models keep float16 inputs
+        dtype = np.float16 if self.input_type == "tensor(float16)" else np.float32
+        output = self.session.run(None, {self.input_name: batch.astype(dtype, copy=False)})[0]
+        return output.astype(np.float32, copy=False)
+
+
+# ---------------- Stub (benchmarks) ----------------
+class StubBackend(InferenceBackend):
+    """
+    Deterministic stand-in with the real model's signature, for benchmark.py
+    and local runs without TensorFlow. Same image -> same class; the fixed
+    per-batch cost (KRISHI_STUB_MODEL_MS) approximates the CNN's forward pass.
+    """
+
+    name = "stub"
+    NUM_CLASSES = 38
+
+    def load(self):
+        from app.config import settings
+
+        self.latency_s = settings.stub_model_ms / 1000
+        self.weights = np.random.default_rng(0).standard_normal((3, self.NUM_CLASSES)).astype(np.float32) * 40
+
+    def predict(self, batch):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        # Mean colour of a coarse grid -> fixed projection -> softmax
+        logits = batch[:, ::16, ::16, :].mean(axis=(1, 2)) @ self.weights
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict_with_features(self, batch):
+        # A coarser colour grid stands in for the CNN's features
+        return self.predict(batch), batch[:, ::32, ::32, :].reshape(len(batch), -1)
+
+
+BACKENDS = {backend.name: backend for backend in (KerasBackend, TFLiteBackend, OnnxBackend, StubBackend)}
+
+
+def create_backend(name: str, model_path: str = "", num_threads: int = 0) -> InferenceBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_path or default_model_path(name), num_threads=num_threads)
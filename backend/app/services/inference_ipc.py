@@ -0,0 +1,388 @@
+import asyncio
+import itertools
+import json
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.preprocessing import INPUT_SHAPE
+
+# ---------------- Shared Inference Server Protocol ----------------
+# With several uvicorn workers, each one loading the CNN multiplies memory and
+# splits traffic into N small batching queues. inference_server.py owns the
+# one model + MicroBatcher instead; workers talk to it over a Unix socket.
+#
+# Image tensors don't go through the socket: each worker connection owns a
+# shared memory segment of `slots` input-sized slots, writes the preprocessed
+# image into a free slot and only sends (request id, slot). Replies are small
+# (model version + 38 probabilities + the feature vector) and go back inline.
+#
+#   hello     client -> server   !HI name_len, slots | shm name
+#   request   client -> server   !BQI kind, request_id, slot (kind P) or json length (kind C) | json
+#   reply     server -> client   !QBI request_id, ok, payload length | payload
+#
+# Predict payload: !HI version_len, feature_len | version | float16 features | float32 probabilities.
+# Control payload (kind C: status, versions, activate, shadow, stop_shadow, batching): json.
+HELLO = struct.Struct("!HI")
+REQUEST = struct.Struct("!BQI")
+REPLY = struct.Struct("!QBI")
+PREDICT_REPLY = struct.Struct("!HI")
+KIND_PREDICT = ord("P")
+KIND_CONTROL = ord("C")
+SLOT_BYTES = int(np.prod(INPUT_SHAPE)) * 4
+
+
+def _attach(name):
+    """Open the client's segment without letting this process's resource tracker unlink it at exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# ---------------- Server ----------------
+class InferenceServer:
+    """Serves one ModelRegistry + MicroBatcher to every connected API worker."""
+
+    def __init__(self, registry, batcher, socket_path):
+        self.registry = registry
+        self.batcher = batcher
+        self.socket_path = socket_path
+        self.clients = 0
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # left behind by a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        print(f"Inference server listening on {self.socket_path}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        self.clients += 1
+        shm = None
+        tasks = set()
+        try:
+            name_len, slots = HELLO.unpack(await reader.readexactly(HELLO.size))
+            shm = _attach((await reader.readexactly(name_len)).decode())
+            inputs = np.ndarray((slots, *INPUT_SHAPE), dtype=np.float32, buffer=shm.buf)
+            while True:
+                kind, request_id, arg = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                if kind == KIND_PREDICT:
+                    task = asyncio.create_task(self._predict(writer, request_id, inputs[arg]))
+                else:
+                    payload = json.loads(await reader.readexactly(arg))
+                    task = asyncio.create_task(self._control(writer, request_id, payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # worker went away, or the server is shutting down
+        finally:
+            self.clients -= 1
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            if shm is not None:
+                inputs = None
+                try:
+                    shm.close()
+                except BufferError:
+                    pass  # a batch still holds a view; the mapping goes when it's collected
+
+    def _reply(self, writer, request_id, ok, payload: bytes):
+        # One write() per reply, so concurrent replies never interleave
+        writer.write(REPLY.pack(request_id, 1 if ok else 0, len(payload)) + payload)
+
+    async def _predict(self, writer, request_id, image):
+        try:
+            version, probabilities, features = await self.batcher.submit(image)
+            version = version.encode()
+            features = b"" if features is None else np.asarray(features).astype("<f2").tobytes()
+            payload = (PREDICT_REPLY.pack(len(version), len(features) // 2) + version + features
+                       + probabilities.astype("<f4").tobytes())
+            self._reply(writer, request_id, True, payload)
+        except Exception as e:
+            self._reply(writer, request_id, False, str(e).encode())
+
+    async def _control(self, writer, request_id, payload):
+        try:
+            result = await asyncio.to_thread(self._run_control, payload)
+            self._reply(writer, request_id, True, json.dumps(result).encode())
+        except Exception as e:
+            self._reply(writer, request_id, False, str(e).encode())
+
+    def _run_control(self, payload):
+        op, registry = payload["op"], self.registry
+        try:
+            if op == "status":
+                return {**registry.status(), "clients": self.clients}
+            if op == "versions":
+                return sorted(registry.versions())
+            if op == "activate":
+                return registry.activate(payload["version"]).status()
+            if op == "shadow":
+                return registry.start_shadow(payload["version"], payload["sample_rate"]).status()
+            if op == "stop_shadow":
+                registry.stop_shadow()
+                return {}
+            if op == "batching":
+                return {
+                    "max_batch_size": self.batcher.max_batch_size,
+                    "max_wait_ms": self.batcher.max_wait * 1000,
+                    **self.batcher.stats.snapshot(),
+                }
+        except KeyError:
+            return {"not_found": True}
+        raise ValueError(f"Unknown control op {op!r}")
+
+
+# ---------------- Client (API worker side) ----------------
+def _unavailable() -> HTTPException:
+    return HTTPException(status_code=503, detail="Inference server unavailable, please retry",
+                         headers={"Retry-After": "1"})
+
+
+class InferenceClient:
+    """
+    Drop-in for MicroBatcher.submit() that forwards to the inference server.
+    Connects lazily and reconnects after the server restarts; requests made
+    while the server is down, or in flight / waiting for a slot when the
+    connection dropped, fail with a 503 and Retry-After.
+    """
+
+    def __init__(self, socket_path, slots=32, timeout_s=30.0):
+        self.socket_path = socket_path
+        self.slots = max(1, slots)
+        self.timeout = timeout_s
+        self._ids = itertools.count(1)
+        self._connect_lock = None
+        self._writer = None
+        self._reader_task = None
+        self._shm = None
+        self._inputs = None
+        self._free = None
+        self._pending = {}  # request_id -> (future, slot or None)
+
+    async def _ensure_connected(self):
+        if self._writer is not None:
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                # No socket yet (server still starting) or refused (restarting)
+                raise ConnectionError(f"Inference server unavailable: {e}") from e
+            self._shm = shared_memory.SharedMemory(create=True, size=self.slots * SLOT_BYTES)
+            self._inputs = np.ndarray((self.slots, *INPUT_SHAPE), dtype=np.float32, buffer=self._shm.buf)
+            self._free = asyncio.Queue()
+            for slot in range(self.slots):
+                self._free.put_nowait(slot)
+            name = self._shm.name.encode()
+            try:
+                writer.write(HELLO.pack(len(name), self.slots) + name)
+                await writer.drain()
+            except ConnectionError:
+                writer.close()
+                self._reset(ConnectionError("Inference server connection lost"))
+                raise
+            self._writer = writer
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_replies(reader))
+
+    async def _read_replies(self, reader):
+        try:
+            while True:
+                request_id, ok, length = REPLY.unpack(await reader.readexactly(REPLY.size))
+                payload = await reader.readexactly(length)
+                future, slot = self._pending.pop(request_id, (None, None))
+                if slot is not None:
+                    # Only now is the server done with the slot, even if the caller gave up
+                    self._free.put_nowait(slot)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload.decode()))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self._reset(ConnectionError(f"Inference server connection lost: {e}"))
+
+    def _reset(self, error):
+        pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(error)
+        if self._free is not None:
+            # Wakes callers blocked on a slot of the dropped segment, see _predict()
+            self._free.put_nowait(None)
+            self._free = None
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        self._inputs = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+                self._shm.unlink()
+            except (BufferError, FileNotFoundError):
+                pass
+            self._shm = None
+
+    async def _request(self, kind, arg, body=b"", slot=None):
+        if self._writer is None:
+            raise ConnectionError("Inference server connection lost")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, slot)
+        self._writer.write(REQUEST.pack(kind, request_id, arg) + body)
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def submit(self, item: np.ndarray):
+        """(model_version, probabilities, features or None) for one preprocessed image."""
+        try:
+            payload = await self._predict(item)
+        except ConnectionError as e:
+            raise _unavailable() from e
+        version_len, feature_len = PREDICT_REPLY.unpack_from(payload)
+        offset = PREDICT_REPLY.size
+        version = payload[offset:offset + version_len].decode()
+        offset += version_len
+        features = np.frombuffer(payload, dtype="<f2", count=feature_len, offset=offset) if feature_len else None
+        probabilities = np.frombuffer(payload, dtype="<f4", offset=offset + 2 * feature_len)
+        return version, probabilities, features
+
+    async def _predict(self, item):
+        await self._ensure_connected()
+        free = self._free
+        # Every slot busy = this worker already has `slots` images queued on the server
+        slot = await asyncio.wait_for(free.get(), self.timeout)
+        if slot is None:
+            # _reset()'s wake-up marker: pass it on to the next waiter, then give up
+            free.put_nowait(None)
+            raise ConnectionError("Inference server connection lost")
+        if free is not self._free:
+            raise ConnectionError("Inference server connection lost")
+        self._inputs[slot] = item
+        return await self._request(KIND_PREDICT, slot, slot=slot)
+
+    async def control(self, op, **kwargs):
+        try:
+            await self._ensure_connected()
+            body = json.dumps({"op": op, **kwargs}).encode()
+            return json.loads(await self._request(KIND_CONTROL, len(body), body))
+        except ConnectionError as e:
+            raise _unavailable() from e
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    async def stop(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        self._reset(ConnectionError("Inference client stopped"))
+
+
+class RemoteModel:
+    """What ModelRegistry.activate() / start_shadow() return, for a model living in the server."""
+
+    def __init__(self, status):
+        self._status = status
+
+    def status(self):
+        return self._status
+
+
+class RemoteModelRegistry:
+    """
+    The ModelRegistry interface for API workers using the inference server.
+    Status is polled once a second so the sync readiness checks stay cheap;
+    the admin actions are forwarded (they run on threadpool threads, so they
+    hop onto the event loop that owns the connection).
+    """
+
+    def __init__(self, client, poll_s=1.0):
+        self.client = client
+        self.poll_s = poll_s
+        self._status = {"state": "not_started", "server": client.socket_path}
+        self._loop = None
+        self._poller = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        if self._poller is None:
+            self._poller = self._loop.create_task(self._poll())
+
+    def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    async def _poll(self):
+        while True:
+            try:
+                status = await self.client.control("status")
+            except Exception as e:
+                status = {"state": "unavailable", "error": str(e.__cause__ or e)}
+            self._status = {**status, "server": self.client.socket_path}
+            await asyncio.sleep(self.poll_s)
+
+    def _call(self, op, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(self.client.control(op, **kwargs), self._loop)
+        result = future.result(self.client.timeout)
+        if isinstance(result, dict) and result.get("not_found"):
+            raise KeyError(kwargs.get("version"))
+        return result
+
+    def wait(self, timeout=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return self._status.get("state") == "ready"
+
+    @property
+    def state(self) -> str:
+        return self._status.get("state", "unavailable")
+
+    @property
+    def active_version(self):
+        return (self._status.get("active") or {}).get("version")
+
+    def status(self) -> dict:
+        return dict(self._status)
+
+    def versions(self):
+        return self._call("versions")
+
+    def activate(self, version):
+        return RemoteModel(self._call("activate", version=version))
+
+    def start_shadow(self, version, sample_rate):
+        return RemoteModel(self._call("shadow", version=version, sample_rate=sample_rate))
+
+    def stop_shadow(self):
+        self._call("stop_shadow")
+
+
+inference_client = (
+    InferenceClient(settings.inference_server, slots=settings.inference_server_slots,
+                    timeout_s=settings.inference_server_timeout_s)
+    if settings.inference_server else None
+)
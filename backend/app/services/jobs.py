@@ -0,0 +1,236 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.services.executor import run_io
+
+# ---------------- Job States ----------------
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+
+# ---------------- Durable Queue ----------------
+class JobQueue:
+    """
+    SQLite-backed job table shared by every worker process on this machine.
+    A job that stays `running` longer than `lease_s` (its worker died) is
+    handed out again, up to `max_attempts` times. All methods block, call
+    them through the I/O pool.
+    """
+
+    def __init__(self, path: str, lease_s: float = 300, max_attempts: int = 3):
+        self.path = path
+        self.lease = lease_s
+        self.max_attempts = max(1, max_attempts)
+        self._local = threading.local()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # The file is only created here, on first use, so importing the
+            # app (tests, scripts, tooling) doesn't leave a jobs.sqlite3 behind
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Autocommit; claim() opens its own write transaction
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, payload TEXT NOT NULL,"
+                " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+                " prediction_id INTEGER, result TEXT, error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, user_id: int, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (job_id, user_id, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, user_id, json.dumps(payload), QUEUED, time.time()),
+        )
+        return job_id
+
+    def claim(self):
+        """Oldest runnable job as a dict (now `running`), or None."""
+        conn = self._conn()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so two workers can't claim the same row
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND started_at < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now - self.lease),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            if row["attempts"] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?",
+                    (FAILED, now, "Gave up after the worker running it stopped responding", row["job_id"]),
+                )
+                conn.execute("COMMIT")
+                return self.claim()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+                (RUNNING, now, row["job_id"]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {**dict(row), "payload": json.loads(row["payload"]), "status": RUNNING}
+
+    def complete(self, job_id: str, prediction_id: int, result: dict):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, prediction_id = ?, result = ? WHERE job_id = ?",
+            (DONE, time.time(), prediction_id, json.dumps(result), job_id),
+        )
+
+    def fail(self, job_id: str, error: str):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?",
+            (FAILED, time.time(), error, job_id),
+        )
+
+    def get(self, job_id: str):
+        row = self._conn().execute(
+            "SELECT job_id, user_id, status, attempts, created_at, started_at, finished_at,"
+            " prediction_id, result, error FROM jobs WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def position(self, job_id: str, created_at: float) -> int:
+        """Queued jobs ahead of this one."""
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, created_at)
+        ).fetchone()[0]
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def prune(self, older_than_s: float) -> int:
+        """Forget finished jobs (the predictions themselves stay in the database)."""
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - older_than_s),
+        )
+        return cursor.rowcount
+
+
+# ---------------- Workers ----------------
+class JobRunner:
+    """
+    `workers` asyncio tasks that claim jobs and await `handler(job)`, which
+    returns (prediction_id, result dict). Jobs submitted through this
+    process start right away; ones submitted through other workers are
+    picked up within `poll_s`.
+    """
+
+    def __init__(self, queue: JobQueue, handler, workers=2, poll_s=1.0, retention_s=86400):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll = poll_s
+        self.retention = retention_s
+        self._tasks = []
+        self._wakeup = None
+        self._changed = None
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        if self.retention:
+            self._tasks.append(loop.create_task(self._prune()))
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        # A job cut off here stays `running` and is retried once its lease runs out
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, user_id: int, payload: dict) -> str:
+        job_id = await run_io(self.queue.enqueue, user_id, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _notify(self):
+        # Wake every wait_for_change() caller, then arm a fresh event for the next change
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, timeout: float):
+        """Return after a job finishes in this process, or after `timeout` (catches other processes)."""
+        changed = self._changed
+        if changed is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _work(self):
+        while True:
+            try:
+                job = await run_io(self.queue.claim)
+            except Exception as e:
+                print(f" Error claiming prediction job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                prediction_id, result = await self.handler(job)
+                await run_io(self.queue.complete, job["job_id"], prediction_id, result)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+                print(f" Prediction job {job['job_id']} failed: {detail}")
+                await run_io(self.queue.fail, job["job_id"], str(detail))
+                self.failed += 1
+            self._notify()
+
+    async def _prune(self):
+        while True:
+            await asyncio.sleep(min(self.retention, 3600))
+            try:
+                await run_io(self.queue.prune, self.retention)
+            except Exception as e:
+                print(f" Error pruning prediction jobs: {e}")
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "processed": self.processed, "failed": self.failed}
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.inference_backends import create_backend, default_model_path
+
+
+# ---------------- Model Path ----------------
+MODEL_PATH = settings.model_path or default_model_path(settings.inference_backend)
+INPUT_SHAPE = (224, 224, 3)
+
+
+# ---------------- Model Lifecycle ----------------
+class ModelLifecycle:
+    """
+    Loads the CNN in a background thread so importing the app stays cheap,
+    then runs a dummy batch through it so the first real request doesn't pay
+    for graph tracing. TensorFlow / ONNX Runtime are only imported inside
+    the backend's load().
+
+    state: not_started -> loading -> warming -> ready (or failed)
+
+    One instance per model version; see ModelRegistry for swapping them.
+    """
+
+    def __init__(self, model_path: str, backend: str = "keras", num_threads: int = 0, warmup_batch_sizes=(1,),
+                 version: str = None, on_ready=None):
+        self.model_path = model_path
+        self.version = version
+        self.on_ready = on_ready
+        self.backend = backend
+        self.num_threads = num_threads
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.model = None
+        self.state = "not_started"
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self):
+        """Kick off loading in the background (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = "loading"
+            self._thread = threading.Thread(target=self._load, name=f"krishi-model-loader-{self.version}", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            model = create_backend(self.backend, self.model_path, num_threads=self.num_threads)
+            model.load()
+            print(f"Model {self.version} loaded successfully from: {self.model_path} ({self.backend})")
+
+            self.state = "warming"
+            # The same call requests make (Keras: the feature model), so its graph is traced here
+            for batch_size in self.warmup_batch_sizes:
+                model.predict_with_features(np.zeros((batch_size, *INPUT_SHAPE), dtype=np.float32))
+
+            self.model = model
+            self.load_seconds = round(time.perf_counter() - started, 2)
+            self.state = "ready"
+            self._ready.set()
+            if self.on_ready is not None:
+                self.on_ready(self)
+        except Exception as e:
+            print(f" Error loading model {self.version} from {self.model_path}: {e}")
+            self.error = str(e)
+            self.state = "failed"
+
+    def status(self) -> dict:
+        return {
+            "version": self.version,
+            "state": self.state,
+            "backend": self.backend,
+            "model_path": self.model_path,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
@@ -0,0 +1,355 @@
+import csv
+import fcntl
+import gzip
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy import delete, func, select
+
+from app.config import settings
+from app.database import engine
+from app.models.models import Log
+from app.services.export import COLUMNS, gzip_csv, keyset_batches
+from app.services.inference_backends import BACKEND_DIR
+
+ARCHIVE_DIR = settings.log_archive_dir or os.path.join(BACKEND_DIR, "log_archive")
+PART_NAME = re.compile(r"^part-(\d+)-(\d+)\.csv\.gz$")
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+class ArchivedLog(NamedTuple):
+    """Same fields as the rows /admin/logs reads from the table."""
+    log_id: int
+    user_id: Optional[int]
+    timestamp: Optional[datetime]
+    action: str
+    details: Optional[str]
+
+
+def _newest_first(row):
+    return (row.timestamp or datetime.min, row.log_id)
+
+
+# ---------------- Archive Files ----------------
+class LogArchive:
+    """
+    Archived logs, one directory per day: <root>/YYYY/MM/DD/part-<first>-<last>.csv.gz
+    where first / last are the log_id range of the part. A day normally has
+    one part; a run cut short before its deletes leaves the same rows for
+    the next run, which sees they're covered by an existing part.
+    """
+
+    def __init__(self, root, cached_days=16):
+        self.root = root
+        self.cached_days = cached_days
+        self._cache = OrderedDict()  # (day, parts) -> rows, newest first
+        self._lock = threading.Lock()
+
+    def day_dir(self, day: date) -> str:
+        return os.path.join(self.root, f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+
+    def parts(self, day: date):
+        """[(first_id, last_id, path)] of one day."""
+        directory = self.day_dir(day)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        found = []
+        for name in names:
+            match = PART_NAME.match(name)
+            if match:
+                found.append((int(match.group(1)), int(match.group(2)), os.path.join(directory, name)))
+        return sorted(found)
+
+    def days(self):
+        """Every archived day, oldest first."""
+        found = []
+        for year in _numeric_entries(self.root):
+            for month in _numeric_entries(os.path.join(self.root, year)):
+                for day in _numeric_entries(os.path.join(self.root, year, month)):
+                    try:
+                        found.append(date(int(year), int(month), int(day)))
+                    except ValueError:
+                        continue
+        return sorted(found)
+
+    def covered(self, day: date, first_id: int, last_id: int) -> bool:
+        return any(first <= first_id and last_id <= last for first, last, _ in self.parts(day))
+
+    def write_part(self, day: date, batches):
+        """
+        Stream (log_id, user_id, timestamp, action, details) batches into a
+        new part file. Returns (first_id, last_id, rows), or None for no rows.
+        """
+        directory = self.day_dir(day)
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+        span = {"first": None, "last": None, "rows": 0}
+
+        def tracked():
+            for rows in batches:
+                if rows:
+                    if span["first"] is None:
+                        span["first"] = rows[0][0]
+                    span["last"] = rows[-1][0]
+                    span["rows"] += len(rows)
+                yield rows
+
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in gzip_csv(COLUMNS["logs"], tracked()):
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())  # on disk before the rows are deleted from the table
+            if not span["rows"]:
+                os.remove(tmp)
+                return None
+            os.replace(tmp, os.path.join(directory, f"part-{span['first']}-{span['last']}.csv.gz"))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return span["first"], span["last"], span["rows"]
+
+    def read_day(self, day: date):
+        """All archived rows of one day as ArchivedLog, newest first."""
+        parts = tuple(self.parts(day))
+        key = (day, parts)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        rows = {}
+        for _, _, path in parts:
+            with gzip.open(path, "rt", newline="") as f:
+                reader = csv.reader(f)
+                next(reader, None)  # header
+                for log_id, user_id, timestamp, action, details in reader:
+                    # Parts can overlap after an interrupted run, log_id dedupes them
+                    rows[int(log_id)] = ArchivedLog(
+                        int(log_id),
+                        int(user_id) if user_id else None,
+                        datetime.fromisoformat(timestamp) if timestamp else None,
+                        action,
+                        details or None,
+                    )
+        ordered = sorted(rows.values(), key=_newest_first, reverse=True)
+
+        with self._lock:
+            self._cache[key] = ordered
+            while len(self._cache) > self.cached_days:
+                self._cache.popitem(last=False)
+        return ordered
+
+    def newest_day(self):
+        days = self.days()
+        return days[-1] if days else None
+
+    def query(self, limit, before=None, since=None, until=None):
+        """
+        Up to `limit` archived rows newest first, strictly older than the
+        `before` (timestamp, log_id) key, within [since, until).
+        """
+        found = []
+        for day in reversed(self.days()):
+            if until and day >= until:
+                continue
+            if since and day < since:
+                break
+            if before and _day_start(day) > before[0]:
+                continue
+            for row in self.read_day(day):
+                if before and _newest_first(row) >= before:
+                    continue
+                found.append(row)
+                if len(found) >= limit:
+                    return found
+        return found
+
+    def merge(self, rows, limit, before=None, since=None, until=None):
+        """
+        Complete a page of `limit` + 1 table rows (newest first) with archived
+        ones where the page reaches back into archived days.
+        """
+        newest = self.newest_day()
+        if newest is None:
+            return rows
+        archive_end = _day_start(newest + timedelta(days=1))
+        if len(rows) > limit and rows[-1].timestamp and rows[-1].timestamp >= archive_end:
+            return rows  # the page ends before anything that was archived
+        seen = {row.log_id for row in rows}
+        archived = [row for row in self.query(limit + 1, before, since, until) if row.log_id not in seen]
+        return sorted([*rows, *archived], key=_newest_first, reverse=True)[:limit + 1]
+
+
+def _numeric_entries(path):
+    try:
+        return sorted(name for name in os.listdir(path) if name.isdigit())
+    except OSError:
+        return []
+
+
+# ---------------- Retention Job ----------------
+class LogRetention:
+    """
+    Moves logs older than `retention_days` (whole days) from the logs table
+    into the archive: each day is streamed into a gzip CSV part, fsynced,
+    and only then deleted in batches of `batch_size` rows with a pause in
+    between, so the audit log writer's inserts never wait long behind it.
+
+    Runs every `interval_s` in a background thread; with several workers a
+    lock file in the archive makes sure only one of them archives at a time.
+    """
+
+    def __init__(self, archive: LogArchive, retention_days=90, batch_size=1000, pause_s=0.05, interval_s=3600):
+        self.archive = archive
+        self.retention_days = retention_days
+        self.batch_size = max(1, batch_size)
+        self.pause = pause_s
+        self.interval = interval_s
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    def cutoff(self, today=None) -> date:
+        """First day that stays in the table."""
+        return (today or date.today()) - timedelta(days=self.retention_days)
+
+    def start(self):
+        if not self.enabled or self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="krishi-log-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        # Not right at boot, the app has better things to do while starting up
+        while not self._stop.wait(min(self.interval, 60) if self.last_run is None else self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f" Error archiving logs: {e}")
+
+    def run_once(self, dry_run=False, progress=None) -> dict:
+        """Archive + delete every full day before the cutoff. Returns what was done."""
+        os.makedirs(self.archive.root, exist_ok=True)
+        with open(os.path.join(self.archive.root, ".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {"skipped": "another process is archiving"}
+            stats = self._archive_days(self.cutoff(), dry_run, progress)
+        if not dry_run:
+            self.last_run = {**stats, "finished_at": datetime.now().isoformat(timespec="seconds")}
+        return stats
+
+    def _archive_days(self, cutoff, dry_run, progress):
+        stats = {"cutoff": cutoff.isoformat(), "days": 0, "archived": 0, "deleted": 0}
+        with engine.connect() as conn:
+            oldest = conn.execute(select(func.min(Log.timestamp))).scalar()
+        if oldest is None:
+            return stats
+
+        day = oldest.date()
+        while day < cutoff and not self._stop.is_set():
+            start, end = _day_start(day), _day_start(day + timedelta(days=1))
+            if dry_run:
+                with engine.connect() as conn:
+                    count = conn.execute(
+                        select(func.count()).select_from(Log).where(Log.timestamp >= start, Log.timestamp < end)
+                    ).scalar()
+                stats["archived"] += count
+            else:
+                archived, deleted = self._archive_day(day, start, end)
+                stats["archived"] += archived
+                stats["deleted"] += deleted
+            stats["days"] += 1
+            if progress:
+                progress(day, stats)
+            day += timedelta(days=1)
+        return stats
+
+    def _day_rows(self, start, end, last_id=None):
+        stmt = select(Log.log_id, Log.user_id, Log.timestamp, Log.action, Log.details).where(
+            Log.timestamp >= start, Log.timestamp < end
+        )
+        if last_id is not None:
+            stmt = stmt.where(Log.log_id <= last_id)
+        for batch in keyset_batches(stmt.order_by(Log.log_id), Log.log_id, self.batch_size):
+            yield [tuple(row) for row in batch]
+
+    def _archive_day(self, day, start, end):
+        """(rows archived, rows deleted) for one day."""
+        with engine.connect() as conn:
+            first_id, last_id = conn.execute(
+                select(func.min(Log.log_id), func.max(Log.log_id)).where(Log.timestamp >= start, Log.timestamp < end)
+            ).one()
+        if first_id is None:
+            return 0, 0
+
+        archived = 0
+        if not self.archive.covered(day, first_id, last_id):
+            written = self.archive.write_part(day, self._day_rows(start, end, last_id))
+            if written is None:
+                return 0, 0
+            first_id, last_id, archived = written
+
+        # Only rows that are in the part file: a late insert for this day stays for the next run
+        deleted = 0
+        while not self._stop.is_set():
+            with engine.begin() as conn:
+                ids = conn.execute(
+                    select(Log.log_id)
+                    .where(Log.timestamp >= start, Log.timestamp < end, Log.log_id.between(first_id, last_id))
+                    .order_by(Log.log_id)
+                    .limit(self.batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                conn.execute(delete(Log).where(Log.log_id.in_(ids)))
+            deleted += len(ids)
+            # Short transactions with gaps between them, so inserts aren't locked out
+            self._stop.wait(self.pause)
+        return archived, deleted
+
+    def status(self) -> dict:
+        days = self.archive.days()
+        return {
+            "retention_days": self.retention_days,
+            "cutoff": self.cutoff().isoformat() if self.enabled else None,
+            "archive_dir": self.archive.root,
+            "archived_days": len(days),
+            "oldest_archived_day": days[0].isoformat() if days else None,
+            "newest_archived_day": days[-1].isoformat() if days else None,
+            "last_run": self.last_run,
+        }
+
+
+log_archive = LogArchive(ARCHIVE_DIR)
+log_retention = LogRetention(
+    log_archive,
+    retention_days=settings.log_retention_days,
+    batch_size=settings.log_retention_batch_size,
+    pause_s=settings.log_retention_pause_ms / 1000,
+    interval_s=settings.log_retention_interval_s,
+)
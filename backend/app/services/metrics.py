@@ -0,0 +1,209 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from app.config import settings
+
+# ---------------- Prometheus Metrics ----------------
+# A deliberately tiny in-process registry rendering the Prometheus text
+# format, so the hot path is a dict lookup + a lock, with no extra dependency.
+# With KRISHI_METRICS_ENABLED=false every call below returns immediately.
+ENABLED = settings.metrics_enabled
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1.0):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_str(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Either set()/inc()/dec() directly, or pass `fn` to read the value at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+        self.fn = fn
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values, amount=1.0):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values, amount=1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return []
+            items = value.items() if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        lines = []
+        for key, value in sorted(items):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return self.header() + lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        if not ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        if not ENABLED:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = self.header()
+        names = self.labels + ("le",)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_str(names, key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}")
+        return lines
+
+
+# ---------------- Registry ----------------
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- App Metrics ----------------
+http_requests = register(Counter(
+    "krishi_http_requests_total", "HTTP requests by router and status class", ("router", "status")))
+http_latency = register(Histogram(
+    "krishi_http_request_seconds", "HTTP request latency by router", ("router",)))
+predict_stage = register(Histogram(
+    "krishi_predict_stage_seconds", "Time spent in each stage of POST /predict", ("stage",)))
+inference_in_flight = register(Gauge(
+    "krishi_inference_in_flight", "Images submitted to the model and not answered yet"))
+
+
+def stage(name):
+    """`with metrics.stage("decode"): ...` times one predict stage."""
+    return predict_stage.time(name)
+
+
+# ---------------- ASGI Middleware ----------------
+ROUTERS = ("auth", "predict", "admin", "user", "health", "uploads")
+
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request, keyed by the router (first path segment)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        segment = scope["path"].lstrip("/").split("/", 1)[0]
+        router = segment if segment in ROUTERS else "other"
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_latency.observe(time.perf_counter() - started, router)
+            http_requests.inc(router, f"{status['code'] // 100}xx")
@@ -0,0 +1,352 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.config import settings
+from app.services.inference_backends import BACKEND_DIR, MODEL_EXTENSIONS
+from app.services.lifecycle import MODEL_PATH, ModelLifecycle
+
+REGISTRY_DIR = settings.model_registry_dir or os.path.join(BACKEND_DIR, "model_registry")
+ACTIVE_FILE = "ACTIVE"
+
+
+def legacy_version(path: str, backend: str) -> str:
+    """Version label for a model file outside the registry: backend-mtime-size."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "unknown"
+    return f"{backend}-{int(stat.st_mtime)}-{stat.st_size}"
+
+
+# ---------------- Shadow Comparison ----------------
+class ShadowStats:
+    """How a shadow (candidate) model compares with the serving one on the same batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.batches = 0
+            self.images = 0
+            self.agreements = 0
+            self.max_abs_diff = 0.0
+            self.active_ms = 0.0
+            self.shadow_ms = 0.0
+            self.skipped = 0
+            self.failures = 0
+
+    def record(self, active_probs, shadow_probs, active_ms, shadow_ms):
+        agreements = int(np.sum(np.argmax(active_probs, axis=1) == np.argmax(shadow_probs, axis=1)))
+        diff = float(np.max(np.abs(active_probs - shadow_probs)))
+        with self._lock:
+            self.batches += 1
+            self.images += len(active_probs)
+            self.agreements += agreements
+            self.max_abs_diff = max(self.max_abs_diff, diff)
+            self.active_ms += active_ms
+            self.shadow_ms += shadow_ms
+
+    def record_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "images": self.images,
+                "top1_agreement": round(self.agreements / self.images, 4) if self.images else None,
+                "max_abs_prob_diff": round(self.max_abs_diff, 6),
+                "active_ms_per_batch": round(self.active_ms / self.batches, 3) if self.batches else None,
+                "shadow_ms_per_batch": round(self.shadow_ms / self.batches, 3) if self.batches else None,
+                "skipped_busy": self.skipped,
+                "failures": self.failures,
+            }
+
+
+# ---------------- Model Registry ----------------
+class ModelRegistry:
+    """
+    Versioned models under model_registry/<version>/<file>.<keras|tflite|onnx>.
+
+    activate() loads and warms a version in the background and only then
+    swaps it in; predict() reads the active model once per batch, so batches
+    already running finish on the old version. The choice is written to
+    model_registry/ACTIVE, which other workers poll, so every worker moves
+    to the new version within `poll_s`.
+
+    Shadow mode runs a second version on a sample of batches in its own
+    thread and records agreement and latency; its output is never served.
+
+    With KRISHI_MODEL_PATH set (or an empty registry) the single file at
+    MODEL_PATH is served as before.
+    """
+
+    def __init__(self, registry_dir, backend="keras", num_threads=0, warmup_batch_sizes=(1,),
+                 model_path="", poll_s=10.0):
+        self.registry_dir = registry_dir
+        self.backend = backend
+        self.num_threads = num_threads
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.model_path = model_path
+        self.poll_s = poll_s
+        self.active = None   # ModelLifecycle serving traffic
+        self.pending = None  # ModelLifecycle loading, swapped in when ready
+        self.shadow = None   # ModelLifecycle compared on sampled traffic
+        self.shadow_sample_rate = 0.0
+        self.shadow_stats = ShadowStats()
+        self.swaps = 0
+        self._lock = threading.Lock()
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="krishi-shadow")
+        self._shadow_busy = False
+        self._watcher = None
+        self._stop = threading.Event()
+
+    # ---- discovery ----
+    def versions(self) -> dict:
+        """{version: model file} for every registry entry usable by this backend."""
+        extension = MODEL_EXTENSIONS[self.backend]
+        found = {}
+        try:
+            entries = sorted(os.scandir(self.registry_dir), key=lambda e: e.name)
+        except OSError:
+            return found
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            files = sorted(name for name in os.listdir(entry.path) if name.endswith(extension))
+            if files:
+                found[entry.name] = os.path.join(entry.path, files[0])
+        return found
+
+    def _read_active_file(self):
+        try:
+            with open(os.path.join(self.registry_dir, ACTIVE_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_active_file(self, version):
+        os.makedirs(self.registry_dir, exist_ok=True)
+        path = os.path.join(self.registry_dir, ACTIVE_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(version + "\n")
+        os.replace(path + ".tmp", path)
+
+    def _initial(self):
+        """(version, path) to serve at boot."""
+        if self.model_path:
+            return legacy_version(self.model_path, self.backend), self.model_path
+        versions = self.versions()
+        chosen = self._read_active_file()
+        if chosen not in versions and versions:
+            # No (valid) pointer yet: newest directory wins
+            chosen = max(versions, key=lambda v: os.path.getmtime(os.path.dirname(versions[v])))
+        if chosen in versions:
+            return chosen, versions[chosen]
+        return legacy_version(MODEL_PATH, self.backend), MODEL_PATH
+
+    # ---- lifecycle ----
+    def start(self):
+        with self._lock:
+            if self.active is not None or self.pending is not None:
+                return
+        self._begin(*self._initial(), persist=False)
+        if not self.model_path and self.poll_s > 0:
+            self._watcher = threading.Thread(target=self._watch, name="krishi-model-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._shadow_pool.shutdown(wait=False, cancel_futures=True)
+
+    def wait(self, timeout=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.active is None:
+            candidate = self.pending
+            if candidate is None or candidate.state == "failed":
+                return False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            # Short waits: the swap lands just after the loader's ready event
+            candidate.wait(0.05 if remaining is None else min(remaining, 0.05))
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return self.active is not None
+
+    @property
+    def state(self) -> str:
+        if self.active is not None:
+            return "ready"
+        if self.pending is not None:
+            return self.pending.state
+        return "not_started"
+
+    @property
+    def active_version(self):
+        active = self.active
+        return active.version if active is not None else None
+
+    def _load(self, version, path, on_ready=None) -> ModelLifecycle:
+        return ModelLifecycle(
+            path,
+            backend=self.backend,
+            num_threads=self.num_threads,
+            warmup_batch_sizes=self.warmup_batch_sizes,
+            version=version,
+            on_ready=on_ready,
+        )
+
+    def _begin(self, version, path, persist) -> ModelLifecycle:
+        with self._lock:
+            if self.active is not None and self.active.version == version and self.pending is None:
+                if persist:
+                    self._write_active_file(version)
+                return self.active
+            if self.pending is not None and self.pending.version == version and self.pending.state != "failed":
+                return self.pending
+            shadow = self.shadow
+            promote = shadow is not None and shadow.version == version and shadow.ready
+            if promote:
+                # The shadow candidate is already loaded and warm
+                candidate = shadow
+                self.shadow, self.shadow_sample_rate = None, 0.0
+            else:
+                candidate = self._load(version, path, on_ready=lambda loaded: self._swap(loaded, persist))
+            self.pending = candidate  # a newer activate() supersedes an older one still loading
+        if promote:
+            self._swap(candidate, persist)
+        else:
+            candidate.start()
+        return candidate
+
+    def _swap(self, candidate, persist):
+        with self._lock:
+            if self.pending is not candidate:
+                return
+            previous = self.active
+            # A single reference assignment: new batches see the new model,
+            # running ones keep the reference they already took.
+            self.active = candidate
+            self.pending = None
+            self.swaps += 1
+        if persist:
+            self._write_active_file(candidate.version)
+        print(f"Model {candidate.version} is now serving" + (f" (was {previous.version})" if previous else ""))
+
+    def activate(self, version: str) -> ModelLifecycle:
+        """Load + warm `version` in the background, then swap it in. KeyError if unknown."""
+        path = self.versions()[version]
+        return self._begin(version, path, persist=True)
+
+    def _watch(self):
+        # Follow activations made through another worker process
+        while not self._stop.wait(self.poll_s):
+            chosen = self._read_active_file()
+            if chosen is None or chosen == self.active_version:
+                continue
+            pending = self.pending
+            if pending is not None and pending.version == chosen:
+                continue
+            path = self.versions().get(chosen)
+            if path is not None:
+                self._begin(chosen, path, persist=False)
+
+    # ---- shadow mode ----
+    def start_shadow(self, version: str, sample_rate: float) -> ModelLifecycle:
+        path = self.versions()[version]
+        with self._lock:
+            if self.shadow is None or self.shadow.version != version:
+                self.shadow = self._load(version, path)
+                self.shadow.start()
+                self.shadow_stats.reset()
+            self.shadow_sample_rate = sample_rate
+            return self.shadow
+
+    def stop_shadow(self):
+        with self._lock:
+            self.shadow = None
+            self.shadow_sample_rate = 0.0
+
+    def _run_shadow(self, shadow, batch, active_probs, active_ms):
+        try:
+            started = time.perf_counter()
+            # Same call as the active model, so the latencies compare like for like
+            shadow_probs, _ = shadow.model.predict_with_features(batch)
+            self.shadow_stats.record(active_probs, shadow_probs, active_ms, (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            print(f" Shadow model {shadow.version} failed: {e}")
+            self.shadow_stats.record_failure()
+        finally:
+            self._shadow_busy = False
+
+    # ---- inference ----
+    def predict(self, batch):
+        """(version, probabilities, features or None) from the active model."""
+        model = self.active
+        started = time.perf_counter()
+        probabilities, features = model.model.predict_with_features(batch)
+        active_ms = (time.perf_counter() - started) * 1000
+
+        shadow = self.shadow
+        if shadow is not None and shadow.ready and random.random() < self.shadow_sample_rate:
+            if self._shadow_busy:
+                # One shadow batch at a time, so the candidate can't steal serving CPU
+                self.shadow_stats.record_skip()
+            else:
+                self._shadow_busy = True
+                # Copy: the batcher reuses its input buffer for the next batch
+                self._shadow_pool.submit(self._run_shadow, shadow, batch.copy(), probabilities, active_ms)
+        return model.version, probabilities, features
+
+    def status(self) -> dict:
+        active, pending, shadow = self.active, self.pending, self.shadow
+        return {
+            "state": self.state,
+            "backend": self.backend,
+            "active": active.status() if active else None,
+            "pending": pending.status() if pending else None,
+            "swaps": self.swaps,
+            "shadow": {
+                **shadow.status(),
+                "sample_rate": self.shadow_sample_rate,
+                **self.shadow_stats.snapshot(),
+            } if shadow else None,
+        }
+
+
+
+def local_registry() -> ModelRegistry:
+    """The registry that loads models into this process."""
+    return ModelRegistry(
+        REGISTRY_DIR,
+        backend=settings.inference_backend,
+        num_threads=settings.inference_threads,
+        # Trace the shapes the batcher will actually send
+        warmup_batch_sizes=sorted({1, max(1, settings.batch_max_size)}) if settings.model_warmup else (),
+        model_path=settings.model_path,
+        poll_s=settings.model_registry_poll_s,
+    )
+
+
+if settings.inference_server:
+    # Models live in inference_server.py, this process only forwards to it
+    from app.services.inference_ipc import RemoteModelRegistry, inference_client
+
+    model_registry = RemoteModelRegistry(inference_client)
+else:
+    model_registry = local_registry()
@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+
+# ---------------- Keyset Pagination ----------------
+# Pages are addressed by the sort key of the last row seen instead of an
+# OFFSET, so page 1000 costs the same index range scan as page 1. Cursors are
+# opaque to clients; the next one is sent back in the X-Next-Cursor header
+# so list endpoints keep returning a plain JSON array.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, with_timestamp: bool = True):
+    """(timestamp, id) for timestamp-keyed cursors, (id,) otherwise."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if with_timestamp:
+            return datetime.fromisoformat(values[0]), int(values[1])
+        return (int(values[0]),)
+    except (ValueError, TypeError, IndexError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def before(ts_column, id_column, cursor: str):
+    """Rows strictly after the cursor in (ts DESC, id DESC) order."""
+    ts, row_id = decode_cursor(cursor)
+    return or_(ts_column < ts, and_(ts_column == ts, id_column < row_id))
+
+
+def set_next_cursor(response: Response, rows, limit: int, key):
+    """Fetch limit + 1 rows; if the extra one came back, advertise the next page."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+    return rows
+
+
+def format_timestamp(value):
+    return value.strftime(TIMESTAMP_FORMAT) if value else None
@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.config import settings
+from app.services import metrics
+
+
+# ---------------- Worker Side ----------------
+# These run inside the hashing processes. bcrypt is deliberately slow
+# (~250 ms at cost 12), so it gets its own processes instead of the thread
+# pool every sync endpoint shares.
+_contexts = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    ctx = _contexts.get(rounds)
+    if ctx is None:
+        ctx = _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return ctx
+
+
+def _rounds_of(hashed: str):
+    # $2b$12$<salt+hash>
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify(password: str, hashed: str, rounds: int):
+    """(matches, new_hash). new_hash is set when the stored hash should be replaced."""
+    ctx = _context(rounds)
+    try:
+        ok, new_hash = ctx.verify_and_update(password, hashed)
+    except ValueError:  # not a hash we recognise
+        return False, None
+    if ok and new_hash is None and _rounds_of(hashed) != rounds:
+        new_hash = ctx.hash(password)
+    return ok, new_hash
+
+
+# ---------------- Password Hasher ----------------
+class PasswordHasher:
+    """
+    Async front for bcrypt on a dedicated process pool.
+
+    At most `workers` hashes run at once; extra callers wait on a semaphore
+    (so the event loop and the shared thread pool stay free). Once
+    `max_waiting` callers are queued, new ones get a 503 with Retry-After
+    instead of joining a queue they would time out in anyway.
+    """
+
+    def __init__(self, workers=2, rounds=12, max_waiting=200):
+        self.workers = max(1, workers)
+        self.rounds = rounds
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.in_flight = 0
+        self._executor = None
+        self._semaphore = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the API process already has threads running
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def start(self):
+        """Spawn the workers now so the first login after boot doesn't pay for it."""
+        pool = self._pool()
+        for _ in range(self.workers):
+            pool.submit(_context, self.rounds)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, op, fn, *args):
+        if self.waiting >= self.max_waiting:
+            hash_rejected.inc(op)
+            raise HTTPException(
+                status_code=503, detail="Too many sign-ins in progress, please retry", headers={"Retry-After": "1"}
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            hash_queue_wait.observe(time.perf_counter() - queued, op)
+            self.in_flight += 1
+            loop = asyncio.get_running_loop()
+            pool = self._pool()
+            with hash_duration.time(op):
+                return await loop.run_in_executor(pool, functools.partial(fn, *args))
+        except BrokenProcessPool:
+            # A worker died (OOM killer etc.), start a fresh pool for the next caller.
+            # Shut the broken one down so its surviving workers and management
+            # thread don't linger; concurrent callers only replace it once.
+            if self._executor is pool:
+                self._executor = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise HTTPException(status_code=503, detail="Password service restarting, please retry",
+                                headers={"Retry-After": "1"})
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str):
+        """(matches, new_hash); store new_hash when it isn't None (cost factor changed)."""
+        ok, new_hash = await self._run("verify", _verify, password, hashed, self.rounds)
+        if new_hash is not None:
+            rehashed.inc()
+        return ok, new_hash
+
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    rounds=settings.password_hash_rounds,
+    max_waiting=settings.password_hash_max_waiting,
+)
+
+
+# ---------------- Metrics ----------------
+hash_duration = metrics.register(metrics.Histogram(
+    "krishi_password_hash_seconds", "bcrypt hash/verify time including the process hop", ("op",)))
+hash_queue_wait = metrics.register(metrics.Histogram(
+    "krishi_password_queue_wait_seconds", "Time waiting for a free password hashing worker", ("op",)))
+hash_rejected = metrics.register(metrics.Counter(
+    "krishi_password_hash_rejected_total", "Hash requests refused because the queue was full", ("op",)))
+rehashed = metrics.register(metrics.Counter(
+    "krishi_password_rehashed_total", "Stored hashes upgraded on login after a cost factor change"))
+metrics.register(metrics.Gauge(
+    "krishi_password_hash_waiting", "Callers waiting for a password hashing worker",
+    fn=lambda: password_hasher.waiting,
+))
+metrics.register(metrics.Gauge(
+    "krishi_password_hash_in_flight", "Password hashes currently running",
+    fn=lambda: password_hasher.in_flight,
+))
@@ -0,0 +1,62 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# ---------------- Model Input ----------------
+TARGET_SIZE = (224, 224)
+INPUT_SHAPE = (*TARGET_SIZE, 3)
+_SCALE = np.float32(1.0 / 255.0)
+
+
+def _open(source):
+    """`source` is the raw upload bytes or a path on disk."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+
+def decode_image(source, out: np.ndarray = None) -> np.ndarray:
+    """
+    Decode one image straight from memory into a (224, 224, 3) float32
+    array in [0, 1], matching tf.keras.preprocessing.image.load_img
+    (nearest resize) + img_to_array / 255.0.
+
+    JPEGs are decoded with draft(), which lets libjpeg do the downscale by
+    1/2, 1/4 or 1/8 while decoding, so a 12 MP phone photo never gets fully
+    expanded in memory. Pass `out` (e.g. one row of a batch tensor) to skip
+    the per-image allocation.
+    """
+    img = _open(source)
+    if img.format == "JPEG":
+        # draft() never goes below the requested size
+        img.draft("RGB", TARGET_SIZE)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != TARGET_SIZE:
+        img = img.resize(TARGET_SIZE, Image.NEAREST)
+
+    if out is None:
+        out = np.empty(INPUT_SHAPE, dtype=np.float32)
+    # uint8 * float32 scalar stays float32, no float64 temporary
+    np.multiply(np.asarray(img, dtype=np.uint8), _SCALE, out=out)
+    return out
+
+
+def decode_batch(sources):
+    """
+    Decode many images into one preallocated (N, 224, 224, 3) float32 tensor.
+    Returns (batch, ok_indexes, {index: error}); `batch` only holds the rows
+    that decoded, in order, or is None if none did.
+    """
+    batch = np.empty((len(sources), *INPUT_SHAPE), dtype=np.float32)
+    ok, errors = [], {}
+    for idx, source in enumerate(sources):
+        try:
+            decode_image(source, out=batch[len(ok)])
+            ok.append(idx)
+        except Exception as e:
+            errors[idx] = f"Image processing failed: {e}"
+    if not ok:
+        return None, ok, errors
+    return batch[:len(ok)], ok, errors
@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# ---------------- Disk Tier ----------------
+class DiskCache:
+    """SQLite-backed second tier so cached results survive worker restarts."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl = ttl_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value, stored_at FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, stored_at = row
+        if self.ttl and time.time() - stored_at > self.ttl:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            return None
+        return json.loads(value)
+
+    def put(self, key: str, value: dict):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+
+
+# ---------------- Prediction Result Cache ----------------
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache mapping (image digest, model version) to the
+    model output, so a re-uploaded photo skips decoding and inference.
+
+    The in-process tier is cheap enough to call from the event loop; the
+    optional disk tier does blocking SQLite I/O and should go through the
+    I/O pool.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 86400, disk_path: str = ""):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.disk = DiskCache(disk_path, ttl_seconds) if disk_path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(digest: str, model_version: str) -> str:
+        return f"{model_version}:{digest}"
+
+    def get(self, digest: str, model_version: str):
+        key = self.make_key(digest, model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if not self.ttl or time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, digest: str, model_version: str, value: dict):
+        key = self.make_key(digest, model_version)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_from_disk(self, digest: str, model_version: str):
+        """Blocking: look in the disk tier and promote a hit into memory."""
+        if self.disk is None:
+            return None
+        value = self.disk.get(self.make_key(digest, model_version))
+        if value is not None:
+            self.put(digest, model_version, value)
+            with self._lock:
+                self.misses -= 1
+                self.hits += 1
+        return value
+
+    def put_to_disk(self, digest: str, model_version: str, value: dict):
+        """Blocking: write through to the disk tier."""
+        if self.disk is not None:
+            self.disk.put(self.make_key(digest, model_version), value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_tier": self.disk is not None,
+            }
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from fastapi import Header, HTTPException, status
+from jose import jwt, JWTError
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.models import User
+from app.services.executor import run_io
+
+# ---------------- JWT Config ----------------
+SECRET_KEY = settings.jwt_secret_key
+ALGORITHM = "HS256"
+
+
+# ---------------- TTL Cache ----------------
+class TTLCache:
+    """Small thread-safe LRU with a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# ---------------- Current User ----------------
+class CurrentUser(NamedTuple):
+    """Detached snapshot of the users row, safe to cache across sessions."""
+    user_id: int
+    name: str
+    email: str
+    role: str
+
+
+# Verified claims per raw token, and user snapshots per user_id. Role changes
+# and deletes call invalidate_user(); other workers catch up within the TTL.
+token_cache = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl_s)
+user_cache = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl_s)
+
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+
+def decode_token(token: str) -> dict:
+    """Verify the JWT signature once, then serve its claims from cache until `exp`."""
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError as e:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Token decode error: {str(e)}")
+        token_cache.put(token, claims)
+
+    # Cached claims must still honour the expiry jwt.decode checked originally
+    exp = claims.get("exp")
+    if exp is not None and exp < time.time():
+        token_cache.pop(token)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token decode error: Signature has expired.")
+    return claims
+
+
+def _load_user(user_id: int):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.user_id == user_id).first()
+        if not user:
+            return None
+        return CurrentUser(user.user_id, user.name, user.email, user.role)
+    finally:
+        db.close()
+
+
+# ---------------- JWT Auth Dependencies ----------------
+async def get_current_user(authorization: str | None = Header(default=None)) -> CurrentUser:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid Authorization header")
+
+    claims = decode_token(authorization.split(" ")[1])
+    user_id = claims.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
+
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await run_io(_load_user, user_id)
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        user_cache.put(user_id, user)
+    return user
+
+
+async def get_current_admin(authorization: str | None = Header(default=None)) -> CurrentUser:
+    user = await get_current_user(authorization)
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
@@ -0,0 +1,190 @@
+import glob
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import anyio
+from PIL import Image, ImageOps
+from starlette.exceptions import HTTPException
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.config import settings
+from app.services import metrics
+from app.services.inference_backends import BACKEND_DIR
+
+UPLOAD_DIR = settings.upload_dir or os.path.join(BACKEND_DIR, "app", "uploads")
+THUMBS_SUBDIR = "thumbs"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+skipped = metrics.register(metrics.Counter(
+    "krishi_thumbnails_skipped_total", "Background thumbnail jobs dropped because the queue was full"))
+
+
+# ---------------- Thumbnail Store ----------------
+class ThumbnailStore:
+    """
+    WebP derivatives of each upload, uploads/thumbs/<digest>.<size>.webp
+    with the longest side at most `size` px. An upload's name always
+    refers to the same bytes, so its thumbnails can be cached forever.
+    """
+
+    def __init__(self, upload_dir, sizes=(128, 384), quality=80, workers=1, max_pending=256):
+        self.upload_dir = upload_dir
+        self.thumb_dir = os.path.join(upload_dir, THUMBS_SUBDIR)
+        self.sizes = tuple(sorted(sizes))
+        self.quality = quality
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+        # Own small pool: thumbnails are nice-to-have and must not hold up decode / inference
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="krishi-thumbs")
+        os.makedirs(self.thumb_dir, exist_ok=True)
+
+    def name(self, filename, size) -> str:
+        return f"{os.path.splitext(filename)[0]}.{size}.webp"
+
+    def path(self, filename, size) -> str:
+        return os.path.join(self.thumb_dir, self.name(filename, size))
+
+    def urls(self, image_path) -> dict:
+        """{size: relative URL} for a stored image_path, in the same uploads/... form."""
+        filename = os.path.basename(image_path or "")
+        if not filename:
+            return {}
+        return {str(size): f"uploads/{THUMBS_SUBDIR}/{self.name(filename, size)}" for size in self.sizes}
+
+    def missing(self, filename):
+        return [size for size in self.sizes if not os.path.exists(self.path(filename, size))]
+
+    def generate(self, source, filename, force=False) -> int:
+        """
+        Write the missing thumbnails of one upload (`source` is its bytes or
+        a path). Returns how many were written.
+        """
+        sizes = self.sizes if force else self.missing(filename)
+        if not sizes:
+            return 0
+        img = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+        if img.format == "JPEG":
+            # Let libjpeg downscale while decoding, we never need more than the largest size
+            img.draft("RGB", (sizes[-1], sizes[-1]))
+        img = ImageOps.exif_transpose(img)  # phone photos are often stored sideways
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+
+        # Largest first, each smaller one is resized from the previous result
+        for size in sorted(sizes, reverse=True):
+            img.thumbnail((size, size), Image.LANCZOS)
+            target = self.path(filename, size)
+            tmp = os.path.join(self.thumb_dir, f".{uuid.uuid4().hex}.part")
+            try:
+                img.save(tmp, "WEBP", quality=self.quality, method=4)
+                os.replace(tmp, target)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        return len(sizes)
+
+    def generate_from_upload(self, filename, force=False) -> int:
+        return self.generate(os.path.join(self.upload_dir, filename), filename, force=force)
+
+    def submit(self, path, filename) -> bool:
+        """
+        Generate from the stored upload in the background; errors are printed,
+        never raised. With `max_pending` already queued it's skipped (False):
+        UploadFiles makes the thumbnail when it's first requested.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                skipped.inc()
+                return False
+            self.pending += 1
+        self._pool.submit(self.generate, path, filename).add_done_callback(self._done)
+        return True
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+        _report_error(future)
+
+    def remove(self, filename):
+        for size in self.sizes:
+            try:
+                os.remove(self.path(filename, size))
+            except FileNotFoundError:
+                pass
+
+    def original_of(self, thumb_name):
+        """Upload filename a thumbnail name was derived from, or None."""
+        digest, _, rest = thumb_name.partition(".")
+        if not digest or not rest.endswith(".webp"):
+            return None
+        for path in glob.glob(os.path.join(glob.escape(self.upload_dir), glob.escape(digest) + ".*")):
+            if os.path.isfile(path):
+                return os.path.basename(path)
+        return None
+
+    def stop(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _report_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f" Error generating thumbnails: {future.exception()}")
+
+
+thumbnails = ThumbnailStore(
+    UPLOAD_DIR,
+    sizes=settings.thumbnail_sizes,
+    quality=settings.thumbnail_quality,
+    workers=settings.thumbnail_workers,
+    max_pending=settings.thumbnail_max_pending,
+)
+
+
+# ---------------- Static Serving ----------------
+class UploadFiles(StaticFiles):
+    """
+    StaticFiles for uploads/: files are never rewritten under the same name
+    (new uploads are content-addressed, older ones carry a unique
+    user_timestamp name), so responses get a strong ETag derived from the
+    name, an immutable Cache-Control and 304s for revalidation. A thumbnail that hasn't been generated yet
+    (upload older than the feature, background job still queued) is made
+    on first request.
+    """
+
+    def __init__(self, *args, store=thumbnails, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store
+
+    async def get_response(self, path, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            directory, _, name = path.replace(os.sep, "/").rpartition("/")
+            original = self.store.original_of(name) if directory == THUMBS_SUBDIR else None
+            if original is None or not any(name == self.store.name(original, s) for s in self.store.sizes):
+                raise
+            await anyio.to_thread.run_sync(self.store.generate_from_upload, original)
+            return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        # The name identifies the bytes (thumbnails: name + size), a strong validator
+        name = os.path.basename(full_path)
+        if not name.startswith("."):
+            etag = f'"{name.rsplit(".", 1)[0]}"'
+            response.headers["etag"] = etag
+            response.headers["cache-control"] = IMMUTABLE
+            if_none_match = next((v for k, v in scope["headers"] if k == b"if-none-match"), None)
+            if if_none_match is not None and response.status_code == 200:
+                tags = [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+                if etag in tags or "*" in tags:
+                    return NotModifiedResponse(response.headers)
+        return response
+
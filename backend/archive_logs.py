@@ -0,0 +1,57 @@
+"""
+Move old rows of the logs table into the compressed log archive now,
+instead of waiting for the app's hourly retention run.
+
+    python archive_logs.py --dry-run                 # what would be archived
+    python archive_logs.py                           # archive using KRISHI_LOG_RETENTION_DAYS
+    python archive_logs.py --older-than-days 30
+    python archive_logs.py --status
+
+Every full day before the cutoff is written to
+<archive>/YYYY/MM/DD/part-<first id>-<last id>.csv.gz and then deleted from
+the table in small batches. Interrupting it is safe; the next run picks up
+where it stopped. /admin/logs reads archived days transparently.
+"""
+import argparse
+import json
+
+from app.config import settings
+from app.database import init_db
+from app.services.log_retention import log_retention
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, default=settings.log_retention_days,
+                        help="keep this many days in the table (default: KRISHI_LOG_RETENTION_DAYS)")
+    parser.add_argument("--batch-size", type=int, default=settings.log_retention_batch_size,
+                        help="rows per DELETE transaction")
+    parser.add_argument("--dry-run", action="store_true", help="count rows per day, change nothing")
+    parser.add_argument("--status", action="store_true", help="show the archive and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        print(json.dumps(log_retention.status(), indent=2))
+        return
+    if args.older_than_days <= 0:
+        parser.error("retention is disabled (KRISHI_LOG_RETENTION_DAYS=0), pass --older-than-days")
+
+    log_retention.retention_days = args.older_than_days
+    log_retention.batch_size = max(1, args.batch_size)
+    init_db()
+
+    def progress(day, stats):
+        print(f"{day}: {stats['archived']} rows archived, {stats['deleted']} deleted so far...", end="\r")
+
+    stats = log_retention.run_once(dry_run=args.dry_run, progress=progress)
+    if "skipped" in stats:
+        print(f"Nothing done: {stats['skipped']}")
+    elif args.dry_run:
+        print(f"\n✅ Would archive {stats['archived']} rows from {stats['days']} days before {stats['cutoff']} (dry run).")
+    else:
+        print(f"\n✅ Archived {stats['archived']} rows and deleted {stats['deleted']} "
+              f"from {stats['days']} days before {stats['cutoff']}.")
+
+
+if __name__ == "__main__":
+    main()
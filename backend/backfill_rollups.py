@@ -0,0 +1,84 @@
+"""
+Rebuild prediction_rollups from the predictions table.
+
+    python backfill_rollups.py                          # everything before today (UTC)
+    python backfill_rollups.py --since 2025-10-01 --until 2025-11-01
+    python backfill_rollups.py --include-today          # first run, before the API was upgraded
+
+Buckets in the range are replaced, so re-running is safe. Today's bucket is
+left alone by default because the API is incrementing it live.
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+
+from app.database import SessionLocal, init_db
+from app.models.models import Prediction, PredictionRollup
+from app.services.analytics import add_to_rollups, utc_today
+from app.services.catalogue import split_label
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, help="first day to rebuild (default: oldest prediction)")
+    parser.add_argument("--until", type=date.fromisoformat, help="day after the last one to rebuild (default: today, UTC)")
+    parser.add_argument("--include-today", action="store_true", help="also rebuild today's bucket")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    until = args.until or utc_today()
+    if args.include_today and not args.until:
+        until = utc_today() + timedelta(days=1)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        since = args.since
+        if since is None:
+            oldest = db.query(func.min(Prediction.created_at)).scalar()
+            if oldest is None:
+                print("No predictions, nothing to backfill.")
+                return
+            since = oldest.date()
+
+        start = datetime.combine(since, datetime.min.time())
+        end = datetime.combine(until, datetime.min.time())
+
+        # Keyset scan over the primary key, only the three columns we need
+        totals = defaultdict(lambda: [0, 0.0])
+        last_id, scanned = 0, 0
+        while True:
+            rows = (
+                db.query(Prediction.prediction_id, Prediction.created_at,
+                         Prediction.predicted_label, Prediction.confidence_score)
+                .filter(Prediction.prediction_id > last_id,
+                        Prediction.created_at >= start, Prediction.created_at < end)
+                .order_by(Prediction.prediction_id)
+                .limit(args.batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                key = (row.created_at.date(), *split_label(row.predicted_label))
+                totals[key][0] += 1
+                totals[key][1] += row.confidence_score
+            last_id = rows[-1].prediction_id
+            scanned += len(rows)
+            print(f"Scanned {scanned} predictions...", end="\r")
+
+        # Swap the range in one transaction so readers never see half a rebuild
+        db.query(PredictionRollup).filter(
+            PredictionRollup.bucket_date >= since, PredictionRollup.bucket_date < until
+        ).delete(synchronize_session=False)
+        add_to_rollups(db, totals)
+        db.commit()
+        print(f"✅ Rebuilt {len(totals)} rollup rows from {scanned} predictions ({since} to {until}, exclusive).")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+HTTP load test for the API: boots uvicorn against a throwaway SQLite DB,
+upload folder, job queue, embeddings and log archive with the deterministic
+stub model (KRISHI_INFERENCE_BACKEND=stub), then drives a weighted mix of
+signup / login / predict / history traffic.
+
+    # 30 s at 1, 8 and 32 concurrent clients, results saved for later
+    python benchmark.py --concurrency 1 8 32 --duration 30 --output bench/before.json
+
+    # Same run after a change, printed side by side with the earlier one
+    python benchmark.py --concurrency 1 8 32 --duration 30 --output bench/after.json --compare bench/before.json
+
+    # Predict-heavy mix, 20 ms simulated forward pass, against a running server
+    python benchmark.py --mix predict=8,history=2 --stub-model-ms 20 --url http://127.0.0.1:8000
+
+Every KRISHI_* variable in the environment is passed through to the server,
+e.g. KRISHI_BATCH_MAX_SIZE=32 python benchmark.py ...
+Needs `httpx` (not a runtime dependency of the API).
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = "signup=1,login=2,predict=5,history=2"
+OPERATIONS = ("signup", "login", "predict", "history")
+PASSWORD = "bench-password"
+
+
+# ---------------- Test Data ----------------
+def make_images(count, seed=0):
+    """Phone-photo sized JPEGs of smooth random colour, so decode/resize cost is realistic."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        small = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+        img = Image.fromarray(small).resize((1024, 768), Image.BILINEAR)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r} in --mix, expected {', '.join(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+# ---------------- Server ----------------
+def start_server(args, scratch_dir):
+    env = dict(os.environ)
+    env.setdefault("KRISHI_DATABASE_URL", f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}")
+    env.setdefault("KRISHI_UPLOAD_DIR", os.path.join(scratch_dir, "uploads"))
+    # Everything else the server writes to disk, so runs never touch backend/ or each other
+    env.setdefault("KRISHI_JOB_QUEUE_PATH", os.path.join(scratch_dir, "jobs.sqlite3"))
+    env.setdefault("KRISHI_EMBEDDINGS_DIR", os.path.join(scratch_dir, "embeddings"))
+    env.setdefault("KRISHI_LOG_ARCHIVE_DIR", os.path.join(scratch_dir, "log_archive"))
+    env.setdefault("KRISHI_MODEL_REGISTRY_DIR", os.path.join(scratch_dir, "model_registry"))
+    env.setdefault("KRISHI_INFERENCE_BACKEND", "stub")
+    env["KRISHI_STUB_MODEL_MS"] = str(args.stub_model_ms)
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+
+async def wait_until_ready(client, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise SystemExit(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("Server did not become ready in time")
+
+
+# ---------------- Traffic ----------------
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, operation, seconds, status):
+        self.latencies[operation].append(seconds * 1000)
+        self.statuses[operation][str(status)] += 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors[operation] += 1
+
+
+class Workload:
+    """Shared state for one benchmark: the user pool, the images and an email counter."""
+
+    def __init__(self, client, images, run_id):
+        self.client = client
+        self.images = images
+        self.run_id = run_id
+        self.users = []  # (user_id, email, token)
+        self._emails = itertools.count()
+
+    def next_email(self):
+        return f"bench-{self.run_id}-{next(self._emails)}@example.com"
+
+    async def signup(self, rng):
+        email = self.next_email()
+        response = await self.client.post("/auth/signup", json={"name": "Bench User", "email": email, "password": PASSWORD})
+        return response, email
+
+    async def login(self, rng, email=None):
+        email = email or rng.choice(self.users)[1]
+        return await self.client.post("/auth/login", json={"email": email, "password": PASSWORD, "role": "user"})
+
+    async def predict(self, rng, token=None):
+        token = token or rng.choice(self.users)[2]
+        image = rng.choice(self.images)
+        return await self.client.post(
+            "/predict/predict/",
+            files={"file": ("leaf.jpg", image, "image/jpeg")},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    async def history(self, rng):
+        user_id = rng.choice(self.users)[0]
+        return await self.client.get(f"/user/{user_id}/history", params={"limit": 20})
+
+    async def run(self, operation, rng):
+        if operation == "signup":
+            response, _ = await self.signup(rng)
+            return response
+        return await getattr(self, operation)(rng)
+
+    async def create_users(self, count, concurrency):
+        """Signup + login + one prediction each, so history has rows to page through."""
+        semaphore = asyncio.Semaphore(concurrency)
+        rng = random.Random(0)
+
+        async def create():
+            async with semaphore:
+                response, email = await self.signup(rng)
+                response.raise_for_status()
+                user_id = response.json()["user_id"]
+                response = await self.login(rng, email)
+                response.raise_for_status()
+                token = response.json()["access_token"]
+                (await self.predict(rng, token)).raise_for_status()
+                self.users.append((user_id, email, token))
+
+        await asyncio.gather(*(create() for _ in range(count)))
+        self.users.sort()
+
+
+async def run_level(workload, weights, concurrency, duration, warmup, seed):
+    """Closed loop: `concurrency` clients each send the next request as soon as the last one returns."""
+    recorder = Recorder()
+    operations, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def client_loop(index):
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            operation = rng.choices(operations, cum_weights=cumulative)[0]
+            try:
+                response = await workload.run(operation, rng)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            finished = time.perf_counter()
+            if now >= measure_from:
+                recorder.record(operation, finished - now, status)
+
+    await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    return summarize(recorder, concurrency, duration)
+
+
+# ---------------- Results ----------------
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return round(sorted_values[index], 2)
+
+
+def summarize(recorder, concurrency, duration):
+    endpoints = {}
+    total = errors = 0
+    for operation in OPERATIONS:
+        values = sorted(recorder.latencies.get(operation, ()))
+        if not values:
+            continue
+        total += len(values)
+        errors += recorder.errors[operation]
+        endpoints[operation] = {
+            "requests": len(values),
+            "errors": recorder.errors[operation],
+            "throughput_rps": round(len(values) / duration, 2),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": round(values[-1], 2),
+            "status_codes": dict(recorder.statuses[operation]),
+        }
+    return {
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / duration, 2),
+        "endpoints": endpoints,
+    }
+
+
+def print_run(run, baseline=None):
+    print(f"\nconcurrency={run['concurrency']}  {run['throughput_rps']} req/s  "
+          f"({run['requests']} requests, {run['errors']} errors)")
+    print(f"  {'endpoint':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for operation, stats in run["endpoints"].items():
+        line = (f"  {operation:<10}{stats['throughput_rps']:>10}{stats['p50_ms']:>10}"
+                f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['errors']:>8}")
+        before = (baseline or {}).get("endpoints", {}).get(operation)
+        if before and before["p95_ms"]:
+            rps_change = (stats["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0
+            p95_change = (stats["p95_ms"] / before["p95_ms"] - 1) * 100
+            line += f"   vs baseline: req/s {rps_change:+.1f}%, p95 {p95_change:+.1f}%"
+        print(line)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------- Main ----------------
+async def benchmark(args):
+    weights = parse_mix(args.mix)
+    images = make_images(args.images, seed=args.seed)
+    run_id = f"{int(time.time())}-{os.getpid()}"
+
+    server = None
+    scratch_dir = tempfile.TemporaryDirectory(prefix="krishi-bench-")
+    base_url = args.url
+    if not base_url:
+        server = start_server(args, scratch_dir.name)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    max_concurrency = max(args.concurrency)
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            await wait_until_ready(client, server)
+            workload = Workload(client, images, run_id)
+            print(f"Creating {args.users} users...")
+            await workload.create_users(args.users, min(max_concurrency, 16))
+
+            runs = []
+            for concurrency in args.concurrency:
+                print(f"Running {args.duration}s at concurrency {concurrency}...")
+                runs.append(await run_level(workload, weights, concurrency, args.duration, args.warmup, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        scratch_dir.cleanup()
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "base_url": args.url or "local",
+            "mix": weights,
+            "users": args.users,
+            "images": args.images,
+            "stub_model_ms": args.stub_model_ms,
+            "workers": args.workers,
+            "server_env": {k: v for k, v in os.environ.items() if k.startswith("KRISHI_")},
+        },
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of booting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=50, help="users created up front for login/predict/history")
+    parser.add_argument("--images", type=int, default=32, help="distinct images; repeats hit the result cache")
+    parser.add_argument("--stub-model-ms", type=float, default=0.0, help="simulated forward pass per batch")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="earlier --output file to print deltas against")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+
+    baseline_runs = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline_runs = {run["concurrency"]: run for run in json.load(f)["runs"]}
+    for run in results["runs"]:
+        print_run(run, baseline_runs.get(run["concurrency"]))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
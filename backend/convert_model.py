@@ -0,0 +1,205 @@
+"""
+Export the Keras model to lighter CPU runtimes and check them against it.
+
+    # TFLite with int8 weights/activations, calibrated on 200 real uploads
+    python convert_model.py convert --format tflite --quantize int8
+
+    # ONNX (needs tf2onnx), float16 weights
+    python convert_model.py convert --format onnx --quantize float16
+
+    # Top-1 agreement and latency of every exported backend vs. Keras
+    python convert_model.py parity --backends tflite onnx --samples 200
+
+Serve an exported model with KRISHI_INFERENCE_BACKEND=tflite (or onnx).
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from app.services.inference_backends import create_backend, default_model_path
+from app.services.preprocessing import decode_image
+
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "app", "uploads")
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+# ---------------- Sample Images ----------------
+def load_samples(directory, limit, seed=0):
+    """Preprocess up to `limit` images from `directory` exactly like /predict does."""
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(directory, pattern)))
+    random.Random(seed).shuffle(paths)
+
+    samples = []
+    for path in paths:
+        if len(samples) >= limit:
+            break
+        try:
+            samples.append(decode_image(path))
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+
+    if not samples:
+        raise SystemExit(f"No usable images found in {directory}")
+    return np.stack(samples)
+
+
+# ---------------- TFLite Export ----------------
+def convert_tflite(model, output, quantize, calibration):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        def representative_dataset():
+            for sample in calibration:
+                yield [sample[np.newaxis]]
+
+        converter.representative_dataset = representative_dataset
+        # Keep float32 input/output so the serving code doesn't change
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+
+# ---------------- ONNX Export ----------------
+class _CalibrationReader:
+    def __init__(self, input_name, calibration):
+        self._batches = iter([{input_name: sample[np.newaxis]} for sample in calibration])
+
+    def get_next(self):
+        return next(self._batches, None)
+
+
+def convert_onnx(model, output, quantize, calibration):
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError:
+        raise SystemExit("ONNX export needs `tf2onnx` installed")
+
+    signature = [tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input")]
+    float_path = output if quantize == "none" else output + ".fp32"
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=float_path)
+
+    if quantize == "float16":
+        import onnx
+        from onnxconverter_common import float16
+
+        onnx.save(float16.convert_float_to_float16(onnx.load(float_path)), output)
+    elif quantize == "int8":
+        from onnxruntime.quantization import QuantType, quantize_static
+
+        quantize_static(
+            float_path, output, _CalibrationReader("input", calibration),
+            weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8,
+        )
+
+    if float_path != output:
+        os.remove(float_path)
+
+
+# ---------------- Commands ----------------
+def cmd_convert(args):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(args.keras_model)
+    calibration = None
+    if args.quantize == "int8":
+        calibration = load_samples(args.calibration_dir, args.calibration_samples)
+        print(f"Calibrating on {len(calibration)} images from {args.calibration_dir}")
+
+    formats = ["tflite", "onnx"] if args.format == "all" else [args.format]
+    for fmt in formats:
+        output = args.output if args.output and len(formats) == 1 else default_model_path(fmt)
+        started = time.perf_counter()
+        if fmt == "tflite":
+            convert_tflite(model, output, args.quantize, calibration)
+        else:
+            convert_onnx(model, output, args.quantize, calibration)
+        size_mb = os.path.getsize(output) / 1e6
+        print(f"✅ {fmt} ({args.quantize}) -> {output} [{size_mb:.1f} MB, {time.perf_counter() - started:.1f}s]")
+
+
+def _timed_predict(backend, samples, batch_size):
+    outputs, seconds = [], 0.0
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start:start + batch_size]
+        started = time.perf_counter()
+        outputs.append(np.asarray(backend.predict(batch)))
+        seconds += time.perf_counter() - started
+    return np.concatenate(outputs), seconds * 1000 / len(samples)
+
+
+def cmd_parity(args):
+    samples = load_samples(args.calibration_dir, args.samples, seed=1)
+    print(f"Comparing on {len(samples)} images, batch size {args.batch_size}")
+
+    baseline = create_backend("keras", args.keras_model)
+    baseline.load()
+    baseline.predict(samples[:1])  # warm-up
+    base_out, base_ms = _timed_predict(baseline, samples, args.batch_size)
+    base_top1 = base_out.argmax(axis=1)
+
+    report = {"samples": len(samples), "batch_size": args.batch_size,
+              "keras": {"ms_per_image": round(base_ms, 3)}}
+    for name in args.backends:
+        try:
+            backend = create_backend(name, getattr(args, f"{name}_model") or "")
+            backend.load()
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            report[name] = {"error": str(e)}
+            continue
+        backend.predict(samples[:1])
+        out, ms = _timed_predict(backend, samples, args.batch_size)
+        report[name] = {
+            "top1_agreement": round(float((out.argmax(axis=1) == base_top1).mean()), 4),
+            "max_abs_prob_diff": round(float(np.abs(out - base_out).max()), 5),
+            "ms_per_image": round(ms, 3),
+            "speedup_vs_keras": round(base_ms / ms, 2) if ms else None,
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keras-model", default=default_model_path("keras"))
+    parser.add_argument("--calibration-dir", default=UPLOAD_DIR, help="sample images (default: app/uploads)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="export the Keras model")
+    convert.add_argument("--format", choices=["tflite", "onnx", "all"], default="tflite")
+    convert.add_argument("--quantize", choices=["none", "float16", "int8"], default="none")
+    convert.add_argument("--calibration-samples", type=int, default=200)
+    convert.add_argument("--output", help="output file (single format only)")
+    convert.set_defaults(func=cmd_convert)
+
+    parity = sub.add_parser("parity", help="compare exported backends with Keras")
+    parity.add_argument("--backends", nargs="+", choices=["tflite", "onnx"], default=["tflite"])
+    parity.add_argument("--tflite-model", default="")
+    parity.add_argument("--onnx-model", default="")
+    parity.add_argument("--samples", type=int, default=200)
+    parity.add_argument("--batch-size", type=int, default=1)
+    parity.add_argument("--report", help="also write the JSON report here")
+    parity.set_defaults(func=cmd_parity)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
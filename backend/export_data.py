@@ -0,0 +1,62 @@
+"""
+Export predictions or logs for offline analysis, same output as
+GET /admin/export/{table} but straight from the database.
+
+    python export_data.py predictions -o predictions.csv.gz
+    python export_data.py predictions --format parquet --crop Tomato --since 2026-01-01 --until 2026-02-01
+    python export_data.py logs --format arrow -o - | python analyse.py
+
+Rows are read in primary-key batches and written batch by batch, so
+memory use doesn't depend on the size of the table. --until is exclusive.
+Parquet and Arrow need `pyarrow`.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+from app.services import export
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=sorted(export.COLUMNS))
+    parser.add_argument("--format", choices=sorted(export.FORMATS), default="csv", help="csv is gzip-compressed")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day to include (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="first day to leave out (YYYY-MM-DD)")
+    parser.add_argument("--crop", help=f"predictions only, one of: {', '.join(export.CROPS)}")
+    parser.add_argument("-o", "--output", help="file to write, '-' for stdout (default: a name from the filters)")
+    args = parser.parse_args()
+
+    try:
+        export.check_format(args.format)
+        export.build_query(args.table, args.since, args.until, args.crop)
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+
+    output = args.output or export.export_filename(args.table, args.format, args.since, args.until, args.crop)
+    chunks = export.stream_export(args.table, args.format, args.since, args.until, args.crop)
+    if output == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+        return
+
+    written = 0
+    tmp = output + ".part"
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+                print(f"Wrote {written / 1e6:.1f} MB...", end="\r", file=sys.stderr)
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    print(f"\n✅ Exported {args.table} to {output} ({written / 1e6:.1f} MB)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Shared inference server: one model and one micro-batching queue for every
+uvicorn worker on this machine, instead of a model copy per worker.
+
+    KRISHI_INFERENCE_SERVER=/run/krishi/inference.sock python inference_server.py &
+    KRISHI_INFERENCE_SERVER=/run/krishi/inference.sock uvicorn app.main:app --workers 4
+
+Workers write preprocessed images into shared memory and exchange only small
+messages with this process over the Unix socket (see app/services/inference_ipc.py).
+Model versions, hot-swaps and shadow mode work as in a single worker; the
+/admin/models endpoints are forwarded here. Without KRISHI_INFERENCE_SERVER
+each worker keeps loading and batching in-process.
+"""
+import argparse
+import asyncio
+import signal
+
+from app.config import settings
+from app.services.batching import MicroBatcher
+from app.services.executor import cpu_pool, shutdown_pools
+from app.services.inference_ipc import InferenceServer
+from app.services.model_registry import local_registry
+
+
+async def serve(socket_path):
+    registry = local_registry()
+
+    def predict_batch(batch):
+        version, probabilities, features = registry.predict(batch)
+        if features is None:
+            features = [None] * len(probabilities)
+        return list(zip([version] * len(probabilities), probabilities, features))
+
+    batcher = MicroBatcher(
+        predict_batch,
+        max_batch_size=settings.batch_max_size,
+        max_wait_ms=settings.batch_max_wait_ms,
+        executor=cpu_pool,
+    )
+    server = InferenceServer(registry, batcher, socket_path)
+
+    registry.start()
+    serving = asyncio.ensure_future(server.serve())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, serving.cancel)
+    try:
+        await serving
+    except asyncio.CancelledError:
+        print("Inference server shutting down")
+    finally:
+        await batcher.stop()
+        registry.stop()
+        shutdown_pools()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=settings.inference_server or "/tmp/krishi-inference.sock",
+                        help="Unix socket to listen on (default: KRISHI_INFERENCE_SERVER)")
+    args = parser.parse_args()
+    asyncio.run(serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
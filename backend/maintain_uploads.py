@@ -0,0 +1,253 @@
+"""
+Maintenance for uploads/ and the image paths stored on predictions.
+
+    # Normalise image_path to uploads/<file> and report rows whose file is gone
+    python maintain_uploads.py fix-paths
+    python maintain_uploads.py fix-paths --dry-run
+
+    # Files in uploads/ that no prediction references: list them, then delete
+    python maintain_uploads.py gc --dry-run
+    python maintain_uploads.py gc --min-age-minutes 120
+
+    # WebP thumbnails for uploads stored before they were generated on upload
+    python maintain_uploads.py thumbnails
+    python maintain_uploads.py thumbnails --force   # after changing sizes / quality
+
+fix-paths reads predictions in primary-key batches, checks the files with a
+thread pool and commits each batch. Progress is saved to a state file, so
+running it again after an interruption carries on from the last committed
+batch (--restart starts over).
+
+gc only considers files older than --min-age-minutes, because /predict
+writes the file before the prediction row commits. Run fix-paths first, so
+every row uses the uploads/<file> form that gc looks up. Deleting an upload
+also deletes its thumbnails.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from sqlalchemy import func, update
+
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.models.models import Prediction
+from app.services.thumbnails import thumbnails
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_DIR = settings.upload_dir or os.path.join(BACKEND_DIR, "app", "uploads")
+DEFAULT_STATE_FILE = os.path.join(BACKEND_DIR, ".maintain_uploads.state.json")
+
+
+# ---------------- Resume State ----------------
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    # Write-then-rename so a crash mid-write can't leave a truncated file
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# ---------------- fix-paths ----------------
+def fix_paths(args):
+    state = {} if args.restart else load_state(args.state_file)
+    last_id = state.get("fix-paths", {}).get("last_id", 0)
+    if last_id:
+        print(f"Resuming after prediction_id={last_id} (--restart to start over)")
+
+    db = SessionLocal()
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    updated = missing = scanned = 0
+    try:
+        max_id = db.query(func.max(Prediction.prediction_id)).scalar() or 0
+        while True:
+            rows = (
+                db.query(Prediction.prediction_id, Prediction.image_path)
+                .filter(Prediction.prediction_id > last_id)
+                .order_by(Prediction.prediction_id)
+                .limit(args.batch_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            filenames = [os.path.basename(row.image_path or "") for row in rows]
+            exists = pool.map(lambda name: bool(name) and os.path.exists(os.path.join(UPLOAD_DIR, name)), filenames)
+
+            changes = []
+            for row, filename, found in zip(rows, filenames, exists):
+                if not filename:
+                    continue
+                if found:
+                    new_path = f"uploads/{filename}"
+                    if row.image_path != new_path:
+                        changes.append({"prediction_id": row.prediction_id, "image_path": new_path})
+                else:
+                    print(f"Missing file for prediction_id={row.prediction_id}: {os.path.join(UPLOAD_DIR, filename)}")
+                    missing += 1
+
+            last_id = rows[-1].prediction_id
+            scanned += len(rows)
+            updated += len(changes)
+            if not args.dry_run:
+                if changes:
+                    # Bulk UPDATE ... WHERE prediction_id = ? for the whole batch
+                    db.execute(update(Prediction), changes)
+                db.commit()
+                state["fix-paths"] = {"last_id": last_id}
+                save_state(args.state_file, state)
+            print(f"Scanned {scanned} rows (prediction_id {last_id}/{max_id}), "
+                  f"{updated} to update, {missing} missing...", end="\r")
+    finally:
+        pool.shutdown()
+        db.close()
+
+    if not args.dry_run:
+        # Finished, the next run starts from the beginning again
+        state.pop("fix-paths", None)
+        save_state(args.state_file, state)
+    verb = "Would update" if args.dry_run else "Updated"
+    print(f"\n✅ {verb} {updated} records. ❌ Missing {missing} files.")
+
+
+# ---------------- gc ----------------
+def iter_upload_files(min_age_s):
+    """(name, size) of regular files in uploads/ last modified more than min_age_s ago."""
+    cutoff = time.time() - min_age_s
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime < cutoff:
+                yield entry.name, stat.st_size
+
+
+def referenced(db, names):
+    paths = [f"uploads/{name}" for name in names]
+    rows = db.query(Prediction.image_path).filter(Prediction.image_path.in_(paths)).distinct()
+    return {os.path.basename(row.image_path) for row in rows}
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        thumbnails.remove(os.path.basename(path))
+        return True
+    except FileNotFoundError:
+        return True
+    except OSError as e:
+        print(f"\nCould not delete {path}: {e}")
+        return False
+
+
+def gc_orphans(args):
+    db = SessionLocal()
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    files = iter_upload_files(args.min_age_minutes * 60)
+    checked = orphans = orphan_bytes = deleted = 0
+    try:
+        while True:
+            batch = dict(islice(files, args.batch_size))
+            if not batch:
+                break
+            # Served by ix_predictions_image_path, one query per batch of files
+            keep = referenced(db, list(batch))
+            db.rollback()  # don't hold a read transaction open across batches
+            batch_orphans = [name for name in batch if name not in keep]
+
+            checked += len(batch)
+            orphans += len(batch_orphans)
+            orphan_bytes += sum(batch[name] for name in batch_orphans)
+            if args.dry_run:
+                if args.verbose:
+                    for name in batch_orphans:
+                        print(f"Orphan: {name} ({batch[name]} bytes)")
+            else:
+                paths = [os.path.join(UPLOAD_DIR, name) for name in batch_orphans]
+                deleted += sum(pool.map(_remove, paths))
+            print(f"Checked {checked} files, {orphans} orphaned ({orphan_bytes / 1e6:.1f} MB)...", end="\r")
+    finally:
+        pool.shutdown()
+        db.close()
+
+    if args.dry_run:
+        print(f"\n✅ {orphans} of {checked} files are orphaned ({orphan_bytes / 1e6:.1f} MB), nothing deleted (dry run).")
+    else:
+        print(f"\n✅ Deleted {deleted} of {orphans} orphaned files ({orphan_bytes / 1e6:.1f} MB) out of {checked} checked.")
+
+
+# ---------------- thumbnails ----------------
+def _thumbnail(name, force):
+    try:
+        return thumbnails.generate_from_upload(name, force=force)
+    except Exception as e:
+        print(f"\nCould not make thumbnails for {name}: {e}")
+        return -1
+
+
+def backfill_thumbnails(args):
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    files = iter_upload_files(0)
+    checked = written = failed = 0
+    try:
+        while True:
+            names = [name for name, _ in islice(files, args.batch_size)]
+            if not names:
+                break
+            results = list(pool.map(lambda name: _thumbnail(name, args.force), names))
+            checked += len(names)
+            written += sum(r for r in results if r > 0)
+            failed += sum(1 for r in results if r < 0)
+            print(f"Checked {checked} uploads, wrote {written} thumbnails, {failed} failed...", end="\r")
+    finally:
+        pool.shutdown()
+    print(f"\n✅ Wrote {written} thumbnails ({', '.join(map(str, thumbnails.sizes))} px) for {checked} uploads. "
+          f"❌ {failed} could not be read.")
+
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fix = subparsers.add_parser("fix-paths", help="normalise image_path and report missing files")
+    fix.add_argument("--batch-size", type=int, default=1000, help="rows per batch / commit")
+    fix.add_argument("--workers", type=int, default=16, help="threads checking files")
+    fix.add_argument("--dry-run", action="store_true", help="report only, don't write to the database")
+    fix.add_argument("--state-file", default=DEFAULT_STATE_FILE, help="where resume progress is kept")
+    fix.add_argument("--restart", action="store_true", help="ignore saved progress and start from the first row")
+    fix.set_defaults(func=fix_paths)
+
+    gc = subparsers.add_parser("gc", help="delete files in uploads/ that no prediction references")
+    gc.add_argument("--batch-size", type=int, default=1000, help="files looked up per query")
+    gc.add_argument("--workers", type=int, default=16, help="threads deleting files")
+    gc.add_argument("--min-age-minutes", type=float, default=60, help="skip files newer than this")
+    gc.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    gc.add_argument("--verbose", action="store_true", help="with --dry-run, list every orphaned file")
+    gc.set_defaults(func=gc_orphans)
+
+    thumbs = subparsers.add_parser("thumbnails", help="generate missing WebP thumbnails for existing uploads")
+    thumbs.add_argument("--batch-size", type=int, default=1000, help="files per progress update")
+    thumbs.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="threads resizing images")
+    thumbs.add_argument("--force", action="store_true", help="rewrite thumbnails that already exist")
+    thumbs.set_defaults(func=backfill_thumbnails)
+
+    args = parser.parse_args()
+    init_db()  # makes sure ix_predictions_image_path exists before gc relies on it
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
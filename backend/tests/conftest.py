@@ -0,0 +1,57 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Settings are read at import time: point every path at a scratch dir and the
+# database at a throwaway SQLite file before anything from app/ is imported.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix="krishi-tests-")
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ["KRISHI_DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'test.db')}"
+os.environ["KRISHI_INFERENCE_BACKEND"] = "stub"
+os.environ["KRISHI_UPLOAD_DIR"] = os.path.join(SCRATCH_DIR, "uploads")
+os.environ["KRISHI_EMBEDDINGS_DIR"] = os.path.join(SCRATCH_DIR, "embeddings")
+os.environ["KRISHI_JOB_QUEUE_PATH"] = os.path.join(SCRATCH_DIR, "jobs.sqlite3")
+os.environ["KRISHI_LOG_ARCHIVE_DIR"] = os.path.join(SCRATCH_DIR, "log_archive")
+os.environ["KRISHI_MODEL_REGISTRY_DIR"] = os.path.join(SCRATCH_DIR, "model_registry")
+os.environ["KRISHI_LOG_RETENTION_INTERVAL_S"] = "0"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def database():
+    from app.database import init_db
+
+    init_db()
+
+
+@pytest.fixture
+def db(database):
+    """A session on an empty database; every table is cleared afterwards."""
+    from app.database import Base, SessionLocal, engine
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def user(db):
+    from app.models.models import User
+
+    row = User(name="Test Farmer", email="farmer@example.com", password="x", role="user")
+    db.add(row)
+    db.commit()
+    return row.user_id
@@ -0,0 +1,125 @@
+import random
+import sys
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from app.models.models import Prediction, PredictionRollup
+from app.services.analytics import bucket_start, query_rollups, record_predictions, utc_today
+from app.services.catalogue import split_label
+
+LABELS = ["Tomato___Early_blight", "Tomato___healthy", "Apple___Apple_scab", "Potato___Late_blight"]
+
+
+def _seed(db, user_id, days=40, per_day=6):
+    """Predictions over the last `days` days, counted into the rollups the way the API does."""
+    rng = random.Random(7)
+    today = utc_today()
+    created = []
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        rows = [(rng.choice(LABELS), round(rng.uniform(0.5, 1.0), 3)) for _ in range(rng.randint(0, per_day))]
+        db.add_all(
+            Prediction(user_id=user_id, image_path="uploads/x.jpg", predicted_label=label,
+                       confidence_score=confidence, model_version="v1",
+                       created_at=datetime.combine(day, time(8)) + timedelta(minutes=i))
+            for i, (label, confidence) in enumerate(rows)
+        )
+        # Same transaction as the rows, like _store_prediction / _store_predictions_bulk
+        record_predictions(db, rows, bucket_date=day)
+        db.commit()
+        created += [(day, label, confidence) for label, confidence in rows]
+    return created
+
+
+def _expected(created, bucket):
+    totals = defaultdict(lambda: [0, 0.0])
+    for day, label, confidence in created:
+        totals[(bucket_start(day, bucket).isoformat(), *split_label(label))][0] += 1
+        totals[(bucket_start(day, bucket).isoformat(), *split_label(label))][1] += confidence
+    return {key: (count, round(total / count, 4)) for key, (count, total) in totals.items()}
+
+
+def _as_dict(result):
+    return {(r["bucket"], r["crop_type"], r["disease_name"]): (r["predictions"], r["avg_confidence"]) for r in result}
+
+
+def _assert_same(result, expected):
+    """Same buckets and counts; averages may differ in the last digit (summation order)."""
+    assert result.keys() == expected.keys()
+    for key, (count, avg) in expected.items():
+        assert result[key][0] == count
+        assert result[key][1] == pytest.approx(avg, abs=1e-3)
+
+
+def _backfill(monkeypatch, *args):
+    import backfill_rollups
+
+    monkeypatch.setattr(sys, "argv", ["backfill_rollups.py", *args])
+    backfill_rollups.main()
+
+
+@pytest.mark.parametrize("bucket", ["day", "week", "month"])
+def test_live_rollups_match_predictions(db, user, bucket):
+    created = _seed(db, user)
+    _assert_same(_as_dict(query_rollups(db, bucket=bucket)), _expected(created, bucket))
+
+
+def test_backfill_rebuilds_what_live_counting_produced(db, user, monkeypatch):
+    _seed(db, user)
+    live = {bucket: query_rollups(db, bucket=bucket) for bucket in ("day", "week", "month")}
+
+    db.query(PredictionRollup).delete()
+    db.commit()
+    _backfill(monkeypatch, "--include-today")
+    for bucket, rows in live.items():
+        _assert_same(_as_dict(query_rollups(db, bucket=bucket)), _as_dict(rows))
+
+    # Buckets in range are replaced, not added to
+    _backfill(monkeypatch, "--include-today")
+    _assert_same(_as_dict(query_rollups(db)), _as_dict(live["day"]))
+
+
+def test_backfill_leaves_today_and_other_ranges_alone(db, user, monkeypatch):
+    created = _seed(db, user, days=10)
+    today = utc_today()
+    since = today - timedelta(days=6)
+    until = today - timedelta(days=3)
+    # Corrupt every bucket; only [since, until) may be repaired
+    db.query(PredictionRollup).update({PredictionRollup.prediction_count: 999})
+    db.commit()
+
+    _backfill(monkeypatch, "--since", since.isoformat(), "--until", until.isoformat())
+    expected = _expected(created, "day")
+    for (bucket, crop, disease), (count, _) in _as_dict(query_rollups(db)).items():
+        if since <= date.fromisoformat(bucket) < until:
+            assert count == expected[(bucket, crop, disease)][0]
+        else:
+            assert count == 999
+
+
+def test_filters_and_exclusive_until(db, user):
+    created = _seed(db, user)
+    since = utc_today() - timedelta(days=20)
+    until = utc_today() - timedelta(days=10)
+    result = query_rollups(db, crop="Tomato", since=since, until=until)
+
+    expected = _expected([c for c in created if since <= c[0] < until and c[1].startswith("Tomato")], "day")
+    _assert_same(_as_dict(result), expected)
+    assert {row["crop_type"] for row in result} <= {"Tomato"}
+
+
+def test_live_bucket_is_the_day_of_created_at(db, user, monkeypatch):
+    # Both sides default to the clock: the DB's now() for created_at, UTC for the bucket
+    db.add(Prediction(user_id=user, image_path="uploads/x.jpg", predicted_label=LABELS[0],
+                      confidence_score=0.9, model_version="v1"))
+    record_predictions(db, [(LABELS[0], 0.9)])
+    db.commit()
+    created_at = db.query(Prediction.created_at).scalar()
+    assert [row["bucket"] for row in query_rollups(db)] == [created_at.date().isoformat()]
+
+    # ... so a backfill reproduces the live bucket instead of moving it a day
+    live = _as_dict(query_rollups(db))
+    _backfill(monkeypatch, "--include-today")
+    assert _as_dict(query_rollups(db)) == live
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from app.services.embeddings import SIGNATURE_DIM, EmbeddingIndex, EmbeddingStore, signature
+from app.services.catalogue import CLASS_LABELS
+
+TOMATO = CLASS_LABELS.index("Tomato___healthy")
+APPLE = CLASS_LABELS.index("Apple___Apple_scab")
+
+
+def _unit(rng, dim):
+    vector = rng.standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def test_rows_stay_aligned_when_features_start_late(tmp_path, rng):
+    # A version served by ONNX / TFLite (no features) first, then by Keras
+    store = EmbeddingStore(str(tmp_path))
+    sigs = {i: _unit(rng, SIGNATURE_DIM) for i in (1, 2, 3, 4)}
+    feats = {i: _unit(rng, 32) for i in (3, 4)}
+    store.append(1, TOMATO, 0.9, sigs[1])
+    store.append(2, TOMATO, 0.8, sigs[2])
+    store.append(3, APPLE, 0.7, sigs[3], feats[3])
+    store.append(4, APPLE, 0.6, sigs[4], feats[4])
+
+    # A fresh reader sees the same thing as the writer's own instance
+    for reader in (store, EmbeddingStore(str(tmp_path))):
+        assert reader.stats()["rows"] == 4
+        assert reader.stats()["feature_dim"] == 32
+        for i in (1, 2):
+            assert not reader.vector_of(i, "features").any()
+        for i in (3, 4):
+            np.testing.assert_allclose(reader.vector_of(i, "features"), feats[i], atol=2e-3)
+        for i in sigs:
+            np.testing.assert_allclose(reader.vector_of(i, "signature"), sigs[i], atol=2e-3)
+
+
+def test_rows_after_features_stop_are_zero_filled(tmp_path, rng):
+    store = EmbeddingStore(str(tmp_path))
+    store.append(1, TOMATO, 0.9, _unit(rng, SIGNATURE_DIM), _unit(rng, 16))
+    store.append(2, TOMATO, 0.9, _unit(rng, SIGNATURE_DIM))
+    store.append(3, TOMATO, 0.9, _unit(rng, SIGNATURE_DIM), _unit(rng, 8))  # wrong size
+    assert store.stats()["rows"] == 3
+    assert not store.vector_of(2, "features").any()
+    assert not store.vector_of(3, "features").any()
+
+
+def test_append_recovers_from_a_half_written_row(tmp_path, rng):
+    store = EmbeddingStore(str(tmp_path))
+    feats = {i: _unit(rng, 16) for i in (1, 2, 3)}
+    store.append(1, TOMATO, 0.9, _unit(rng, SIGNATURE_DIM), feats[1])
+    store.append(2, TOMATO, 0.8, _unit(rng, SIGNATURE_DIM), feats[2])
+    # A writer died after the id, label and half a signature of its row
+    with open(tmp_path / "ids.i64", "ab") as f:
+        f.write(np.array([99], dtype="<i8").tobytes())
+    with open(tmp_path / "labels.i16", "ab") as f:
+        f.write(np.array([APPLE], dtype="<i2").tobytes())
+    with open(tmp_path / "signature.f16", "ab") as f:
+        f.write(np.zeros(SIGNATURE_DIM // 2, dtype="<f2").tobytes())
+    assert store.stats()["rows"] == 2
+
+    store.append(3, APPLE, 0.7, _unit(rng, SIGNATURE_DIM), feats[3])
+    reader = EmbeddingStore(str(tmp_path))
+    assert reader.stats()["rows"] == 3
+    assert reader.vector_of(99, "features") is None
+    for i in (1, 2, 3):
+        np.testing.assert_allclose(reader.vector_of(i, "features"), feats[i], atol=2e-3)
+    assert [m[0] for m in reader.search(feats[3], k=1)] == [3]
+
+
+def test_search_ranks_by_cosine_and_honours_filters(tmp_path, rng):
+    store = EmbeddingStore(str(tmp_path))
+    query = _unit(rng, 24)
+    other = _unit(rng, 24)
+    other = (other - (other @ query) * query) / np.linalg.norm(other - (other @ query) * query)
+    for prediction_id in range(1, 41):
+        # Each id sits a little further from the query, so id order is similarity order
+        angle = prediction_id * np.pi / 90
+        vector = np.cos(angle) * query + np.sin(angle) * other
+        store.append(prediction_id, TOMATO if prediction_id % 2 else APPLE, 0.5, _unit(rng, SIGNATURE_DIM), vector)
+
+    ids = [match[0] for match in store.search(query, k=5)]
+    assert ids == [1, 2, 3, 4, 5]
+
+    assert [m[0] for m in store.search(query, k=3, crop="Apple")] == [2, 4, 6]
+    assert [m[0] for m in store.search(query, k=3, exclude_id=1)] == [2, 3, 4]
+    assert [m[0] for m in store.search(query, k=5, ids=[40, 7, 12, 999])] == [7, 12, 40]
+    assert [m[0] for m in store.search(query, k=5, crop="Tomato", ids=[7, 12, 40])] == [7]
+    assert store.search(query, k=5, ids=[]) == []
+
+
+def test_index_keeps_model_versions_apart(tmp_path, rng):
+    index = EmbeddingIndex(str(tmp_path))
+    vector = _unit(rng, 16)
+    index.add("v1", 1, TOMATO, 0.9, _unit(rng, SIGNATURE_DIM), vector)
+    index.add("v1", 2, TOMATO, 0.9, _unit(rng, SIGNATURE_DIM), vector)
+    index.add("v2", 3, TOMATO, 0.9, _unit(rng, SIGNATURE_DIM), vector)
+
+    assert [m[0] for m in index.similar("v1", 1)] == [2]
+    assert index.similar("v2", 3) == []
+    assert index.similar("v1", 3) is None
+    assert index.similar("v1", 1, ids=[1]) == []
+    assert index.store("v1").crop_of(1) == "Tomato"
+    assert index.store("v1").crop_of(3) is None
+
+
+def test_signature_shape_and_norm(rng):
+    image = rng.random((224, 224, 3), dtype=np.float32)
+    sig = signature(image)
+    assert sig.shape == (SIGNATURE_DIM,)
+    assert np.linalg.norm(sig) == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,101 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.models.models import Log, Prediction
+from app.services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+BASE = datetime(2026, 3, 1, 9, 30)
+
+
+def _add_predictions(db, user_id, timestamps):
+    rows = [
+        Prediction(user_id=user_id, image_path=f"uploads/{i}.jpg", predicted_label="Tomato___healthy",
+                   confidence_score=0.9, model_version="v1", created_at=ts)
+        for i, ts in enumerate(timestamps)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+def _page_through(fetch, limit):
+    """Follow X-Next-Cursor until it's gone; returns the ids in the order served."""
+    seen, cursor = [], None
+    while True:
+        response = Response()
+        page = fetch(response, cursor, limit)
+        seen.extend(page)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return seen
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(BASE, 42)) == (BASE, 42)
+    assert decode_cursor(encode_cursor(7), with_timestamp=False) == (7,)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor("yesterday", 1), encode_cursor(BASE)])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 7, 50])
+def test_history_pages_break_timestamp_ties_by_id(db, user, limit):
+    from app.routers.user import get_user_history
+
+    # Runs of identical timestamps straddle page boundaries for every limit
+    timestamps = [BASE + timedelta(minutes=i // 5) for i in range(23)]
+    rows = _add_predictions(db, user, timestamps)
+    expected = [r.prediction_id for r in sorted(rows, key=lambda r: (r.created_at, r.prediction_id), reverse=True)]
+
+    def fetch(response, cursor, limit):
+        page = get_user_history(user, response, cursor=cursor, limit=limit, db=db)
+        return [p.prediction_id for p in page]
+
+    assert _page_through(fetch, limit) == expected
+
+
+def test_history_cursor_excludes_later_inserts(db, user):
+    from app.routers.user import get_user_history
+
+    _add_predictions(db, user, [BASE] * 4)
+    response = Response()
+    first = get_user_history(user, response, cursor=None, limit=2, db=db)
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+
+    # A newer prediction arriving between pages must not shift the next page
+    _add_predictions(db, user, [BASE + timedelta(hours=1)])
+    second = get_user_history(user, Response(), cursor=cursor, limit=2, db=db)
+    assert [p.prediction_id for p in first] == [4, 3]
+    assert [p.prediction_id for p in second] == [2, 1]
+
+
+def test_admin_logs_page_across_the_archive(db, user, tmp_path, monkeypatch):
+    from app.routers.admin import get_logs
+    from app.services.log_retention import LogArchive, LogRetention
+
+    # 30 logs over six days, several per second; the two oldest days get archived
+    noon = datetime.combine(date.today(), time(12))
+    logs = [Log(user_id=user, action="Prediction made", details=f"#{i}",
+                timestamp=noon - timedelta(days=i // 5, seconds=i % 2)) for i in range(30)]
+    db.add_all(logs)
+    db.commit()
+    expected = [log.log_id for log in sorted(logs, key=lambda r: (r.timestamp, r.log_id), reverse=True)]
+
+    archive = LogArchive(str(tmp_path))
+    stats = LogRetention(archive, retention_days=3, batch_size=3, pause_s=0).run_once()
+    assert stats["deleted"] == 10
+    assert db.query(Log).count() == 20
+
+    monkeypatch.setattr("app.routers.admin.log_archive", archive)
+
+    def fetch(response, cursor, limit):
+        page = get_logs(response, cursor=cursor, limit=limit, since=None, until=None, db=db, admin=None)
+        return [log.log_id for log in page]
+
+    assert _page_through(fetch, 4) == expected